@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Zastępczy konwerter DOCX → PDF (CONVERTER_BACKEND=fake).
+
+Nie uruchamia LibreOffice - generuje PDF z poprawną liczbą stron
+i symuluje opóźnienie konwersji. Służy do testów obciążeniowych,
+żeby mierzyć limity skalowania reszty pipeline'u w izolacji.
+"""
+
+import re
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+from zipfile import ZipFile
+
+import fitz  # PyMuPDF
+
+
+# Rozmiar strony A4 w punktach PDF
+A4_WIDTH = 595
+A4_HEIGHT = 842
+
+_slots: Optional[threading.Semaphore] = None
+_slots_lock = threading.Lock()
+
+
+def count_docx_pages(docx_path: Path) -> int:
+    """
+    Szacuje liczbę stron DOCX bez renderowania.
+
+    Liczy jawne podziały strony i podziały sekcji w word/document.xml.
+    <Pages> z docProps/app.xml jest nieaktualne (docxtpl kopiuje je z szablonu,
+    także po wyrenderowaniu pętli z produktami), więc służy tylko jako
+    przybliżenie dla dokumentów bez żadnych podziałów (tekst płynący).
+    """
+    with ZipFile(docx_path) as zip_ref:
+        names = set(zip_ref.namelist())
+        document = zip_ref.read("word/document.xml").decode("utf-8", errors="ignore")
+        app = zip_ref.read("docProps/app.xml").decode("utf-8", errors="ignore") if "docProps/app.xml" in names else ""
+
+    breaks = len(re.findall(r'<w:br\b[^>]*w:type="page"', document))
+    breaks += len(re.findall(r"<w:pageBreakBefore\b(?![^>]*w:val=\"(?:0|false)\")", document))
+
+    # Każda sekcja poza pierwszą zaczyna się od nowej strony, chyba że jej
+    # sectPr (w:type) mówi "continuous"
+    sections = re.findall(r"<w:sectPr\b[^>]*/>|<w:sectPr\b[^>]*>.*?</w:sectPr>", document, flags=re.DOTALL)
+    breaks += sum(1 for section in sections[1:] if 'w:val="continuous"' not in section)
+
+    if breaks:
+        return breaks + 1
+
+    match = re.search(r"<Pages>(\d+)</Pages>", app)
+    return max(int(match.group(1)), 1) if match else 1
+
+
+def fake_convert_docx_to_pdf(
+    docx_path: Path,
+    tmpdir: Path,
+    latency_ms: float = 1500,
+    jitter_ms: float = 0,
+    concurrency: int = 0,
+) -> Path:
+    """
+    Generuje tmpdir/<nazwa>.pdf z tyloma stronami, ile ma dokument.
+
+    Args:
+        docx_path: Ścieżka do pliku DOCX
+        tmpdir: Katalog tymczasowy dla pliku PDF
+        latency_ms: Symulowany czas konwersji
+        jitter_ms: Losowe odchylenie czasu konwersji (+/-)
+        concurrency: Maksymalna liczba równoległych konwersji (0 = bez limitu),
+            np. 1 odwzorowuje jeden profil LibreOffice
+
+    Returns:
+        Ścieżka do pliku PDF
+    """
+    page_count = count_docx_pages(docx_path)
+    delay = max(latency_ms + random.uniform(-jitter_ms, jitter_ms), 0) / 1000.0
+
+    slots = _get_slots(concurrency)
+    if slots is not None:
+        slots.acquire()
+    try:
+        time.sleep(delay)
+    finally:
+        if slots is not None:
+            slots.release()
+
+    pdf_doc = fitz.open()
+    for page_num in range(page_count):
+        page = pdf_doc.new_page(width=A4_WIDTH, height=A4_HEIGHT)
+        page.insert_text((72, 72), f"{docx_path.name} - fake page {page_num + 1}/{page_count}", fontsize=12)
+
+    pdf_path = tmpdir / f"{docx_path.stem}.pdf"
+    pdf_doc.save(pdf_path)
+    pdf_doc.close()
+
+    return pdf_path
+
+
+def _get_slots(concurrency: int) -> Optional[threading.Semaphore]:
+    global _slots
+
+    if concurrency <= 0:
+        return None
+    with _slots_lock:
+        if _slots is None:
+            _slots = threading.Semaphore(concurrency)
+        return _slots
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Test obciążeniowy / soak test dla Offer Rendering API.
+
+Odtwarza requesty z examples/*.json (oraz ich syntetyczne warianty)
+ze stałą częstotliwością i ograniczoną współbieżnością na działającej instancji.
+Raportuje percentyle opóźnień, odsetek błędów oraz przebieg w czasie:
+renderowania w toku, głębokość kolejki i RSS procesu serwera (z /health).
+
+Realistyczne limity skalowania bez LibreOffice:
+    CONVERTER_BACKEND=fake FAKE_CONVERTER_LATENCY_MS=1500 python3 offer_api.py
+
+Użycie:
+    python3 loadtest.py --rate 2 --concurrency 8 --duration 60
+    python3 loadtest.py --requests 'examples/request_*.json' --variants 5 --json report.json
+"""
+
+import argparse
+import copy
+import glob
+import json
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Any
+
+
+def load_requests(pattern: str, variants: int, seed: int) -> List[Dict[str, Any]]:
+    """
+    Wczytuje requesty z plików JSON i dokłada `variants` syntetycznych wariantów
+    każdego z nich (zmienione placeholdery i podzbiór produktów).
+    """
+    rng = random.Random(seed)
+    requests = []
+
+    for path in sorted(glob.glob(pattern)):
+        with open(path, "r", encoding="utf-8") as f:
+            base = json.load(f)
+        requests.append({"name": path, "body": base})
+
+        for i in range(variants):
+            variant = copy.deepcopy(base)
+            for key, value in variant.get("placeholders", {}).items():
+                if isinstance(value, str):
+                    variant["placeholders"][key] = f"{value} #{i + 1}"
+                elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                    variant["placeholders"][key] = round(value * rng.uniform(0.5, 2.0), 2)
+
+            products = variant.get("products", [])
+            if products:
+                variant["products"] = rng.sample(products, rng.randint(1, len(products)))
+
+            requests.append({"name": f"{path}#variant{i + 1}", "body": variant})
+
+    if not requests:
+        raise SystemExit(f"No request files match: {pattern}")
+
+    return requests
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Percentyl metodą nearest-rank"""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(pct / 100.0 * len(sorted_values)), 1)
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def get_health(base_url: str, timeout: float = 5.0) -> Optional[Dict[str, Any]]:
+    """Zwraca JSON z /health (także przy 503 'warming') lub None"""
+    try:
+        with urllib.request.urlopen(f"{base_url}/health", timeout=timeout) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        try:
+            return json.loads(e.read())
+        except ValueError:
+            return None
+    except (urllib.error.URLError, OSError, ValueError):
+        return None
+
+
+class LoadTest:
+    """
+    Generator obciążenia w modelu open-loop: requesty są planowane co 1/rate s
+    niezależnie od czasu odpowiedzi. Opóźnienie liczone jest od zaplanowanego
+    startu (uwzględnia czekanie na wolny slot), czas obsługi - od wysłania.
+    """
+
+    def __init__(self, args: argparse.Namespace, requests: List[Dict[str, Any]]):
+        self.args = args
+        self.base_url = args.url.rstrip("/")
+        self.requests = requests
+        self.results: List[Dict[str, Any]] = []
+        self.timeline: List[Dict[str, Any]] = []
+        self.in_flight = 0
+        self.backlog = 0
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def _send(self, item: Dict[str, Any], scheduled_at: float) -> None:
+        with self._lock:
+            self.backlog -= 1
+            self.in_flight += 1
+
+        sent_at = time.time()
+        body = dict(item["body"])
+        if self.args.image_format:
+            body["image_format"] = self.args.image_format
+
+        request = urllib.request.Request(
+            f"{self.base_url}/render",
+            data=json.dumps(body).encode("utf-8"),
+            headers={"Content-Type": "application/json", "X-API-Key": self.args.api_key},
+            method="POST",
+        )
+
+        status, size, error = 0, 0, None
+        try:
+            with urllib.request.urlopen(request, timeout=self.args.timeout) as response:
+                status = response.status
+                size = len(response.read())
+        except urllib.error.HTTPError as e:
+            status = e.code
+            error = e.read()[:200].decode("utf-8", errors="replace")
+        except (urllib.error.URLError, OSError) as e:
+            error = str(e)
+
+        finished_at = time.time()
+        with self._lock:
+            self.in_flight -= 1
+            self.results.append({
+                "name": item["name"],
+                "status": status,
+                "ok": 200 <= status < 300,
+                "bytes": size,
+                "latency": finished_at - scheduled_at,
+                "service_time": finished_at - sent_at,
+                "error": error,
+            })
+
+    def _sample(self, started_at: float) -> None:
+        """Co --sample-interval s zapisuje stan klienta i serwera"""
+        while not self._done.wait(self.args.sample_interval):
+            health = get_health(self.base_url) or {}
+            process = health.get("process", {})
+            jobs = health.get("jobs", {})
+
+            with self._lock:
+                sample = {
+                    "t": round(time.time() - started_at, 1),
+                    "client_in_flight": self.in_flight,
+                    "client_backlog": self.backlog,
+                    "completed": len(self.results),
+                    "errors": sum(1 for r in self.results if not r["ok"]),
+                }
+            renders = process.get("renders", {})
+            sample["server_in_flight"] = renders.get("in_flight")
+            # coordinator: kolejka zadań dla workerów; local: requesty czekające na wątek puli
+            sample["queue_depth"] = jobs["queued"] if "queued" in jobs else renders.get("queued")
+            sample["rss_mb"] = process.get("rss_mb")
+            self.timeline.append(sample)
+
+            if not self.args.quiet:
+                print(
+                    f"[{sample['t']:>7.1f}s] done={sample['completed']} err={sample['errors']} "
+                    f"in_flight={sample['client_in_flight']} backlog={sample['client_backlog']} "
+                    f"server_in_flight={sample['server_in_flight']} queue={sample['queue_depth']} "
+                    f"rss={sample['rss_mb']}MB"
+                )
+
+    def run(self) -> Dict[str, Any]:
+        total = int(self.args.rate * self.args.duration)
+        rng = random.Random(self.args.seed)
+        started_at = time.time()
+
+        sampler = threading.Thread(target=self._sample, args=(started_at,), daemon=True)
+        sampler.start()
+
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as executor:
+            for i in range(total):
+                scheduled_at = started_at + i / self.args.rate
+                delay = scheduled_at - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+
+                item = self.requests[i % len(self.requests)] if self.args.sequential else rng.choice(self.requests)
+                with self._lock:
+                    self.backlog += 1
+                executor.submit(self._send, item, scheduled_at)
+
+        self._done.set()
+        sampler.join()
+
+        return self.report(time.time() - started_at)
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        latencies = sorted(r["latency"] for r in self.results if r["ok"])
+        service_times = sorted(r["service_time"] for r in self.results if r["ok"])
+        errors = [r for r in self.results if not r["ok"]]
+
+        status_counts: Dict[str, int] = {}
+        for r in self.results:
+            key = str(r["status"] or "connection_error")
+            status_counts[key] = status_counts.get(key, 0) + 1
+
+        def summary(values: List[float]) -> Dict[str, Optional[float]]:
+            return {
+                f"p{pct}": (round(percentile(values, pct), 3) if values else None)
+                for pct in (50, 90, 95, 99)
+            } | {"max": round(values[-1], 3) if values else None}
+
+        rss_values = [s["rss_mb"] for s in self.timeline if s["rss_mb"] is not None]
+
+        return {
+            "requests": len(self.results),
+            "elapsed_s": round(elapsed, 1),
+            "throughput_rps": round(len(self.results) / elapsed, 3) if elapsed else None,
+            "error_rate": round(len(errors) / len(self.results), 4) if self.results else None,
+            "status_counts": status_counts,
+            "latency_s": summary(latencies),
+            "service_time_s": summary(service_times),
+            "rss_mb": {
+                "start": rss_values[0] if rss_values else None,
+                "end": rss_values[-1] if rss_values else None,
+                "max": max(rss_values) if rss_values else None,
+            },
+            "sample_errors": [r["error"] for r in errors[:5]],
+            "timeline": self.timeline,
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load / soak test for Offer Rendering API")
+    parser.add_argument("--url", default="http://localhost:7077", help="Bazowy URL API")
+    parser.add_argument("--api-key", default="devkey", help="X-API-Key")
+    parser.add_argument("--requests", default="examples/*.json", help="Wzorzec plików z requestami")
+    parser.add_argument("--variants", type=int, default=0, help="Liczba syntetycznych wariantów na request")
+    parser.add_argument("--rate", type=float, default=1.0, help="Requesty na sekundę")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maksymalna liczba równoległych requestów")
+    parser.add_argument("--duration", type=float, default=60.0, help="Czas trwania testu (s)")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Timeout pojedynczego requestu (s)")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="Co ile sekund próbkować /health")
+    parser.add_argument("--image-format", default=None, help="Nadpisuje image_format w requestach")
+    parser.add_argument("--sequential", action="store_true", help="Requesty po kolei zamiast losowo")
+    parser.add_argument("--seed", type=int, default=42, help="Ziarno losowania wariantów i kolejności")
+    parser.add_argument("--wait-ready", type=float, default=0, help="Czekaj max N s aż /health zwróci 'ready'")
+    parser.add_argument("--json", dest="json_path", default=None, help="Zapisz pełny raport do pliku JSON")
+    parser.add_argument("--quiet", action="store_true", help="Bez wypisywania przebiegu w czasie")
+    args = parser.parse_args()
+
+    if args.rate <= 0 or args.concurrency <= 0:
+        parser.error("--rate and --concurrency must be positive")
+
+    base_url = args.url.rstrip("/")
+    deadline = time.time() + args.wait_ready
+    while True:
+        health = get_health(base_url)
+        if health and health.get("status") == "ready":
+            break
+        if time.time() >= deadline:
+            if not health:
+                raise SystemExit(f"API not reachable: {base_url}/health")
+            break
+        time.sleep(1)
+
+    requests = load_requests(args.requests, args.variants, args.seed)
+    print(f"Load test: {base_url} rate={args.rate}/s concurrency={args.concurrency} "
+          f"duration={args.duration}s requests={len(requests)} converter={health.get('converter_backend')}")
+
+    report = LoadTest(args, requests).run()
+
+    print("\n" + "=" * 60)
+    print(f"Requests:     {report['requests']} in {report['elapsed_s']}s ({report['throughput_rps']} req/s)")
+    print(f"Error rate:   {report['error_rate']}  {report['status_counts']}")
+    print(f"Latency (s):  {report['latency_s']}")
+    print(f"Service (s):  {report['service_time_s']}")
+    print(f"RSS (MB):     {report['rss_mb']}")
+    for error in report["sample_errors"]:
+        print(f"  error: {error}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Report saved to: {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,20 +11,33 @@ import subprocess
 import tempfile
 import shutil
 import re
+import time
+import threading
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple, Callable
 from io import BytesIO
 import zipfile
 from zipfile import ZipFile
 
 from fastapi import FastAPI, HTTPException, Header, Request
 from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 import fitz  # PyMuPDF
-from PIL import Image
 from docxtpl import DocxTemplate, InlineImage
 from docx.shared import Mm
 
+from preview_images import (
+    PREVIEW_FORMATS, MEDIA_TYPES, pixmap_to_array, analyze_page, trim_margins, choose_codec, use_palette,
+    encode_page
+)
+from render_farm import (
+    AssetPublisher, JobQueue, create_artifact_store, fetch_manifest, prepare_worker_cache, run_worker, sync_assets
+)
+from template_registry import AssetRegistry
+from fake_converter import fake_convert_docx_to_pdf
+
 # ========== KONFIGURACJA Z ENV ==========
 API_KEY = os.getenv("API_KEY", "devkey")
 PORT = int(os.getenv("PORT", "7077"))
@@ -34,11 +47,97 @@ PRODUCTS_ROOT = Path(os.getenv("PRODUCTS_ROOT", "products"))
 JPEG_QUALITY = int(os.getenv("JPEG_QUALITY", "85"))
 DPI = int(os.getenv("DPI", "100"))
 
+# Konwerter DOCX → PDF: libreoffice (domyślnie) | fake (testy obciążeniowe, bez LibreOffice)
+CONVERTER_BACKEND = os.getenv("CONVERTER_BACKEND", "libreoffice").lower()
+FAKE_CONVERTER_LATENCY_MS = float(os.getenv("FAKE_CONVERTER_LATENCY_MS", "1500"))
+FAKE_CONVERTER_JITTER_MS = float(os.getenv("FAKE_CONVERTER_JITTER_MS", "0"))
+FAKE_CONVERTER_CONCURRENCY = int(os.getenv("FAKE_CONVERTER_CONCURRENCY", "0"))
+
+if CONVERTER_BACKEND not in ("libreoffice", "fake"):
+    raise RuntimeError(f"Unknown CONVERTER_BACKEND: {CONVERTER_BACKEND} (expected libreoffice or fake)")
+
+# Podglądy stron: jpeg (progresywny, domyślnie) | png | webp | avif | auto (kodek per strona)
+PREVIEW_FORMAT = os.getenv("PREVIEW_FORMAT", "jpeg").lower()
+PREVIEW_TRIM_MARGINS = os.getenv("PREVIEW_TRIM_MARGINS", "false").lower() in ("1", "true", "yes")
+PREVIEW_SKIP_BLANK = os.getenv("PREVIEW_SKIP_BLANK", "false").lower() in ("1", "true", "yes")
+
+if PREVIEW_FORMAT not in PREVIEW_FORMATS:
+    raise RuntimeError(f"Unknown PREVIEW_FORMAT: {PREVIEW_FORMAT} (expected one of {', '.join(PREVIEW_FORMATS)})")
+
+# Tryb pracy: local (domyślnie), coordinator (kolejkuje zadania), worker (renderuje zadania)
+RENDER_MODE = os.getenv("RENDER_MODE", "local").lower()
+# Worker: URL koordynatora albo lista URL-i wszystkich front-endów po przecinku
+COORDINATOR_URLS = [
+    url.strip() for url in os.getenv("COORDINATOR_URL", "http://localhost:7077").split(",") if url.strip()
+]
+JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT", "180"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+# Katalog cache workera - synchronizowane kopie szablonów/produktów (nie checkout templates/!)
+WORKER_CACHE_ROOT = Path(os.getenv("WORKER_CACHE_ROOT", "worker-cache"))
+
+if RENDER_MODE not in ("local", "coordinator", "worker"):
+    raise RuntimeError(f"Unknown RENDER_MODE: {RENDER_MODE} (expected local, coordinator or worker)")
+
+# Warmup przy starcie: none (domyślnie) | all | lista szablonów po przecinku
+WARMUP = os.getenv("WARMUP", "none").strip()
+
+# Hot-reload szablonów/produktów z atomową podmianą wersji (tylko RENDER_MODE=local)
+HOT_RELOAD = os.getenv("HOT_RELOAD", "false").lower() in ("1", "true", "yes")
+HOT_RELOAD_INTERVAL = float(os.getenv("HOT_RELOAD_INTERVAL", "2"))
+HOT_RELOAD_SETTLE_SECONDS = float(os.getenv("HOT_RELOAD_SETTLE_SECONDS", "2"))
+HOT_RELOAD_WARM_RENDER = os.getenv("HOT_RELOAD_WARM_RENDER", "false").lower() in ("1", "true", "yes")
+# Domyślnie katalog tymczasowy procesu, usuwany przy zamknięciu serwera
+HOT_RELOAD_STAGING_ROOT = os.getenv("HOT_RELOAD_STAGING_ROOT", "")
+
+if HOT_RELOAD and RENDER_MODE != "local":
+    raise RuntimeError("HOT_RELOAD is only supported with RENDER_MODE=local")
+
+# Współdzielony magazyn artefaktów i kolejka (tylko w trybie rozproszonym)
+ARTIFACT_STORE = create_artifact_store() if RENDER_MODE != "local" else None
+ASSET_PUBLISHER = AssetPublisher(ARTIFACT_STORE) if RENDER_MODE == "coordinator" else None
+JOB_QUEUE = JobQueue(lease_seconds=JOB_LEASE_SECONDS) if RENDER_MODE == "coordinator" else None
+
+# Rejestr wersji szablonów/produktów (HOT_RELOAD); walidator zdefiniowany niżej
+TEMPLATE_REGISTRY = AssetRegistry(
+    roots={"templates": TEMPLATES_ROOT, "products": PRODUCTS_ROOT},
+    staging_root=Path(HOT_RELOAD_STAGING_ROOT or tempfile.mkdtemp(prefix="offer-versions-")),
+    validators={"templates": lambda path, name: validate_template_version(path, name)},
+    settle_seconds=HOT_RELOAD_SETTLE_SECONDS,
+) if HOT_RELOAD else None
+
+# Liczniki renderowań raportowane przez /health (testy obciążeniowe)
+# in_flight: requesty /render w toku; active: renderowania wykonywane w wątku (tryb local)
+RENDER_STATS: Dict[str, int] = {"in_flight": 0, "active": 0, "completed": 0, "failed": 0}
+_RENDER_STATS_LOCK = threading.Lock()
+
+# Wynik sprawdzenia LibreOffice (subprocess) - cache'owany, żeby /health i /render go nie powtarzały
+LIBREOFFICE_CHECK_TTL = 60.0
+_LIBREOFFICE_CHECK: Dict[str, Any] = {"available": None, "checked_at": 0.0, "refreshing": False}
+_LIBREOFFICE_CHECK_LOCK = threading.Lock()
+
+# Stan warmupu raportowany przez /health
+WARMUP_STATE: Dict[str, Any] = {"status": "pending", "seconds": None, "templates": {}}
+
+# Cache naprawionych szablonów: ścieżka → (mtime_ns, size, bajty DOCX po fix_jinja_tags_in_docx)
+_FIXED_TEMPLATE_CACHE: Dict[Path, tuple] = {}
+_FIXED_TEMPLATE_LOCK = threading.Lock()
+
 # ========== FASTAPI APP ==========
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Uruchamia warmup w tle, żeby /health mógł w tym czasie zwracać 'warming'"""
+    threading.Thread(target=run_startup, name="warmup", daemon=True).start()
+    libreoffice_status()  # pierwsze sprawdzenie LibreOffice w tle
+    yield
+    if TEMPLATE_REGISTRY is not None:
+        TEMPLATE_REGISTRY.stop(remove_staging=not HOT_RELOAD_STAGING_ROOT)
+
+
 app = FastAPI(
     title="Offer Rendering API",
     description="Generowanie ofert z szablonów DOCX → PDF → JPG",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 
@@ -57,6 +156,41 @@ class RenderRequest(BaseModel):
     placeholders: Dict[str, Any] = Field(default_factory=dict, description="Placeholders do podstawienia w szablonie")
     products: List[ProductItem] = Field(default_factory=list, description="Lista produktów do wstawienia")
     return_mode: Optional[str] = Field("zip", description="'first_page_inline' lub 'zip' (domyślnie)")
+    image_format: Optional[str] = Field(None, description="'jpeg', 'png', 'webp', 'avif' lub 'auto' (domyślnie PREVIEW_FORMAT)")
+    trim_margins: Optional[bool] = Field(None, description="Przycinanie białych marginesów (domyślnie PREVIEW_TRIM_MARGINS)")
+    skip_blank_pages: Optional[bool] = Field(None, description="Pomijanie pustych stron (domyślnie PREVIEW_SKIP_BLANK)")
+
+
+class JobClaimRequest(BaseModel):
+    worker_id: str = Field(..., description="Identyfikator workera (host-pid)")
+    wait: Optional[float] = Field(20.0, description="Maksymalny czas oczekiwania na zadanie (s)")
+
+
+class JobResult(BaseModel):
+    worker_id: Optional[str] = Field(None, description="Identyfikator workera")
+    artifact: Optional[str] = Field(None, description="SHA-256 ZIP-a ze stronami w magazynie artefaktów")
+    error: Optional[str] = Field(None, description="Komunikat błędu, jeśli renderowanie się nie udało")
+
+
+# ========== MIDDLEWARE: LICZNIKI RENDEROWAŃ ==========
+# Rejestrowany przed verify_api_key, więc jest warstwą wewnętrzną - odrzucenia 401 nie są liczone
+@app.middleware("http")
+async def track_renders(request: Request, call_next):
+    """Liczy renderowania w toku i zakończone (dla /health i testów obciążeniowych)"""
+    if request.url.path != "/render":
+        return await call_next(request)
+
+    with _RENDER_STATS_LOCK:
+        RENDER_STATS["in_flight"] += 1
+    failed = True
+    try:
+        response = await call_next(request)
+        failed = response.status_code >= 400
+        return response
+    finally:
+        with _RENDER_STATS_LOCK:
+            RENDER_STATS["in_flight"] -= 1
+            RENDER_STATS["failed" if failed else "completed"] += 1
 
 
 # ========== MIDDLEWARE: BEZPIECZEŃSTWO ==========
@@ -77,89 +211,220 @@ async def verify_api_key(request: Request, call_next):
     return await call_next(request)
 
 
+# ========== STARTUP: WARMUP ==========
+def run_startup() -> None:
+    """
+    Ładuje rejestr szablonów (HOT_RELOAD), wykonuje warmup i startuje watcher.
+    Zawsze kończy w stanie końcowym - błąd jest zapisywany w WARMUP_STATE["error"].
+    """
+    WARMUP_STATE["status"] = "warming"
+    try:
+        if TEMPLATE_REGISTRY is not None:
+            try:
+                TEMPLATE_REGISTRY.scan(initial=True)
+            except Exception as e:
+                # Szablony, których nie udało się załadować, watcher spróbuje opublikować ponownie
+                WARMUP_STATE["error"] = f"Template registry scan failed: {e}"
+                print(WARMUP_STATE["error"])
+
+        run_warmup()
+    except Exception as e:
+        WARMUP_STATE["error"] = f"Warmup failed: {e}"
+        print(WARMUP_STATE["error"])
+    finally:
+        # Błąd warmupu nie blokuje ruchu - /health raportuje go w warmup.error
+        WARMUP_STATE["status"] = "ready"
+        if TEMPLATE_REGISTRY is not None:
+            TEMPLATE_REGISTRY.start_watcher(interval=HOT_RELOAD_INTERVAL)
+
+
 # ========== ENDPOINT: HEALTH ==========
 @app.get("/health")
-def health_check():
-    """Sprawdzenie czy serwer działa i czy LibreOffice jest dostępny"""
-    libreoffice_available = check_libreoffice()
+async def health_check():
+    """
+    Sprawdzenie czy serwer działa i czy LibreOffice jest dostępny.
 
-    return {
-        "status": "ok",
+    Zwraca 503 ze statusem 'warming', dopóki warmup nie zostanie zakończony,
+    żeby load balancer nie kierował ruchu do zimnej instancji.
+
+    Handler jest asynchroniczny i nie blokuje: odpowiada także wtedy, gdy pula
+    wątków jest zajęta renderowaniem (to właśnie mierzą liczniki i loadtest).
+    """
+    libreoffice_available = libreoffice_status()
+    ready = WARMUP_STATE["status"] == "ready"
+
+    health = {
+        "status": "ready" if ready else "warming",
+        "warmup": {**WARMUP_STATE, "templates": dict(WARMUP_STATE["templates"])},
+        "render_mode": RENDER_MODE,
+        "converter_backend": CONVERTER_BACKEND,
         "libreoffice_available": libreoffice_available,
         "templates_root": str(TEMPLATES_ROOT.absolute()),
         "products_root": str(PRODUCTS_ROOT.absolute()),
         "dpi": DPI,
-        "jpeg_quality": JPEG_QUALITY
+        "jpeg_quality": JPEG_QUALITY,
+        "preview_format": PREVIEW_FORMAT,
+        "process": {"rss_mb": current_rss_mb(), "renders": render_stats()}
     }
+    if JOB_QUEUE is not None:
+        health["jobs"] = JOB_QUEUE.stats()
+    if TEMPLATE_REGISTRY is not None:
+        health["versions"] = TEMPLATE_REGISTRY.status()
+
+    if not ready:
+        return Response(content=json.dumps(health), status_code=503, media_type="application/json")
+
+    return health
 
 
 # ========== ENDPOINT: RENDER ==========
 @app.post("/render")
-def render_offer(req: RenderRequest):
+async def render_offer(req: RenderRequest):
     """
     Główny endpoint do renderowania ofert.
 
     1. Renderuje szablon DOCX z docxtpl
     2. Konwertuje DOCX → PDF (LibreOffice)
     3. Konwertuje PDF → JPG (PyMuPDF, 100 dpi)
-    4. Zwraca pierwszą stronę jako image/jpeg lub ZIP z wszystkimi stronami
+    4. Zwraca pierwszą stronę jako obraz (image/jpeg, image/png, ...) lub ZIP z wszystkimi stronami
+
+    Handler jest asynchroniczny: lokalny pipeline działa w threadpoolu, a w trybie
+    coordinator oczekiwanie na workera nie zajmuje wątku.
     """
 
+    # Walidacja: format podglądów
+    if req.image_format is not None and req.image_format not in PREVIEW_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown image_format: {req.image_format}. Expected one of: {', '.join(PREVIEW_FORMATS)}"
+        )
+
     # Walidacja: czy szablon istnieje
     template_path = TEMPLATES_ROOT / req.template
-    if not template_path.exists() or not template_path.is_dir():
+    if TEMPLATE_REGISTRY is not None:
+        template_exists = TEMPLATE_REGISTRY.has("templates", req.template)
+    else:
+        template_exists = template_path.exists() and template_path.is_dir()
+
+    if not template_exists:
+        # HOT_RELOAD: katalog istnieje, ale żadna jego wersja nie przeszła walidacji
+        rejection = TEMPLATE_REGISTRY.status()["errors"].get(f"templates/{req.template}") if TEMPLATE_REGISTRY else None
+        if rejection is not None:
+            raise HTTPException(
+                status_code=503,
+                detail=f"Template {req.template} failed validation and is not available: {rejection}"
+            )
         raise HTTPException(
             status_code=404,
             detail=f"Template folder not found: {req.template}. Check TEMPLATES_ROOT={TEMPLATES_ROOT}"
         )
 
-    # Sprawdź czy LibreOffice jest dostępny
-    if not check_libreoffice():
+    # Sprawdź czy konwerter jest dostępny (w trybie coordinator konwertują workery)
+    if RENDER_MODE != "coordinator" and not await run_in_threadpool(check_converter):
         raise HTTPException(
             status_code=500,
             detail="LibreOffice not found. Install: brew install libreoffice (macOS) or apt-get install libreoffice (Linux)"
         )
 
-    # Tymczasowe katalogi/pliki
-    with tempfile.TemporaryDirectory() as tmpdir:
-        tmpdir_path = Path(tmpdir)
+    # Tymczasowe katalogi/pliki (I/O i kompresja poza pętlą zdarzeń)
+    tmpdir_path = Path(await run_in_threadpool(tempfile.mkdtemp))
+    try:
+        # 1-4. Renderuj lokalnie albo zleć zadanie workerom
+        version_headers = {}
+        if RENDER_MODE == "coordinator":
+            page_paths = await render_pages_remote(req, tmpdir_path)
+        else:
+            page_paths, template_version = await run_in_threadpool(render_pages_tracked, req, tmpdir_path)
+            if template_version:
+                version_headers["X-Template-Version"] = template_version
 
-        try:
-            # 1. Przygotuj kontekst dla docxtpl
-            context = prepare_context(req.placeholders, req.products)
+        # 5. Zwróć wynik
+        return await run_in_threadpool(build_render_response, req, page_paths, version_headers)
 
-            # 2. Renderuj szablon(y) DOCX
-            rendered_docx = render_template(template_path, context, tmpdir_path)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error rendering offer: {str(e)}")
+    finally:
+        await run_in_threadpool(shutil.rmtree, tmpdir_path, True)
 
-            # 3. Konwertuj DOCX → PDF
-            pdf_path = convert_docx_to_pdf(rendered_docx, tmpdir_path)
 
-            # 4. Konwertuj PDF → JPG
-            jpg_paths = convert_pdf_to_jpg(pdf_path, tmpdir_path, dpi=DPI, quality=JPEG_QUALITY)
+# ========== ENDPOINTY: KOLEJKA ZADAŃ (RENDER_MODE=coordinator) ==========
+@app.post("/jobs/claim")
+async def claim_job(claim: JobClaimRequest):
+    """Worker pobiera następne zadanie (long-polling). 204 = brak zadań."""
+    if JOB_QUEUE is None:
+        raise HTTPException(status_code=404, detail="Job queue is only available with RENDER_MODE=coordinator")
 
-            # 5. Zwróć wynik
-            if req.return_mode == "first_page_inline":
-                # Zwróć tylko pierwszą stronę jako image/jpeg
-                with open(jpg_paths[0], "rb") as f:
-                    image_data = f.read()
-                return Response(content=image_data, media_type="image/jpeg")
-            else:
-                # Zwróć wszystkie strony jako ZIP
-                zip_buffer = create_zip(jpg_paths)
-                return StreamingResponse(
-                    BytesIO(zip_buffer),
-                    media_type="application/zip",
-                    headers={"Content-Disposition": f"attachment; filename=offer_{req.template}.zip"}
-                )
+    job = await JOB_QUEUE.claim(claim.worker_id, wait=min(max(claim.wait or 0, 0), 60))
+    if job is None:
+        return Response(status_code=204)
 
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error rendering offer: {str(e)}")
+    return {"job_id": job.job_id, **job.payload}
+
+
+@app.post("/jobs/{job_id}/complete")
+async def complete_job(job_id: str, result: JobResult):
+    """Worker zgłasza wynik zadania: skrót artefaktu albo błąd"""
+    if JOB_QUEUE is None:
+        raise HTTPException(status_code=404, detail="Job queue is only available with RENDER_MODE=coordinator")
+
+    if not result.artifact and not result.error:
+        raise HTTPException(status_code=400, detail="Either artifact or error is required")
+
+    if not JOB_QUEUE.complete(job_id, artifact=result.artifact, error=result.error):
+        raise HTTPException(status_code=404, detail=f"Job not found or already completed: {job_id}")
+
+    return {"status": "ok"}
+
+
+@app.get("/assets/manifest")
+async def assets_manifest():
+    """Manifest wszystkich szablonów i produktów (publikuje je do magazynu) - warmup workerów"""
+    if ASSET_PUBLISHER is None:
+        raise HTTPException(status_code=404, detail="Asset manifest is only available with RENDER_MODE=coordinator")
+
+    def publish_everything() -> Dict[str, str]:
+        manifest = ASSET_PUBLISHER.publish_all(TEMPLATES_ROOT, "templates")
+        manifest.update(ASSET_PUBLISHER.publish_all(PRODUCTS_ROOT, "products"))
+        return manifest
+
+    return {"manifest": await run_in_threadpool(publish_everything)}
 
 
 # ========== FUNKCJE POMOCNICZE ==========
 
+def check_converter() -> bool:
+    """Sprawdza czy wybrany konwerter DOCX → PDF jest dostępny"""
+    return CONVERTER_BACKEND == "fake" or check_libreoffice()
+
+
+def current_rss_mb() -> Optional[float]:
+    """Aktualne zużycie pamięci (RSS) procesu w MB; None, jeśli niedostępne"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+
+    try:
+        import resource
+
+        # Fallback (macOS): szczytowe RSS w bajtach
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024), 1)
+    except ImportError:
+        return None
+
+
 def check_libreoffice() -> bool:
-    """Sprawdza czy LibreOffice jest dostępny w systemie"""
+    """Sprawdza czy LibreOffice jest dostępny w systemie (wynik cache'owany przez LIBREOFFICE_CHECK_TTL s)"""
+    with _LIBREOFFICE_CHECK_LOCK:
+        if (
+            _LIBREOFFICE_CHECK["available"] is not None
+            and time.time() - _LIBREOFFICE_CHECK["checked_at"] < LIBREOFFICE_CHECK_TTL
+        ):
+            return _LIBREOFFICE_CHECK["available"]
+
     try:
         result = subprocess.run(
             ["libreoffice", "--version"],
@@ -167,12 +432,419 @@ def check_libreoffice() -> bool:
             text=True,
             timeout=5
         )
-        return result.returncode == 0
+        available = result.returncode == 0
     except (FileNotFoundError, subprocess.TimeoutExpired):
-        return False
+        available = False
+
+    with _LIBREOFFICE_CHECK_LOCK:
+        _LIBREOFFICE_CHECK.update(available=available, checked_at=time.time())
+    return available
+
+
+def libreoffice_status() -> Optional[bool]:
+    """
+    Ostatni znany wynik check_libreoffice() bez blokowania (dla /health).
+    Nieaktualny wynik jest odświeżany w osobnym wątku; None = jeszcze nie sprawdzono.
+    """
+    with _LIBREOFFICE_CHECK_LOCK:
+        stale = time.time() - _LIBREOFFICE_CHECK["checked_at"] >= LIBREOFFICE_CHECK_TTL
+        if stale and not _LIBREOFFICE_CHECK["refreshing"]:
+            _LIBREOFFICE_CHECK["refreshing"] = True
+            threading.Thread(target=_refresh_libreoffice_status, name="libreoffice-check", daemon=True).start()
+        return _LIBREOFFICE_CHECK["available"]
+
+
+def _refresh_libreoffice_status() -> None:
+    try:
+        check_libreoffice()
+    finally:
+        with _LIBREOFFICE_CHECK_LOCK:
+            _LIBREOFFICE_CHECK["refreshing"] = False
+
+
+def render_pages(
+    req: RenderRequest,
+    tmpdir: Path,
+    template_path: Optional[Path] = None,
+    product_dirs: Optional[Dict[str, Path]] = None,
+    already_fixed: bool = False,
+) -> List[Path]:
+    """
+    Lokalny pipeline: docxtpl → DOCX → PDF (LibreOffice) → obrazy stron.
+
+    Args:
+        req: Request renderowania
+        tmpdir: Katalog tymczasowy
+        template_path: Katalog szablonu (domyślnie TEMPLATES_ROOT/<template>)
+        product_dirs: {product_id: katalog} (domyślnie PRODUCTS_ROOT/<product_id>)
+        already_fixed: Tagi Jinja2 już naprawione (wersje z rejestru HOT_RELOAD)
+
+    Returns:
+        Lista ścieżek do obrazów stron (page_001.jpg, page_002.png, ...)
+    """
+    if template_path is None:
+        template_path = TEMPLATES_ROOT / req.template
+
+    # 1. Przygotuj kontekst dla docxtpl
+    context = prepare_context(req.placeholders, req.products, product_dirs)
+
+    # 2. Renderuj szablon(y) DOCX
+    rendered_docx = render_template(template_path, context, tmpdir, already_fixed=already_fixed)
+
+    # 3. Konwertuj DOCX → PDF
+    pdf_path = convert_docx_to_pdf(rendered_docx, tmpdir)
+
+    # 4. Konwertuj PDF → obrazy stron
+    return convert_pdf_to_images(
+        pdf_path,
+        tmpdir,
+        dpi=DPI,
+        quality=JPEG_QUALITY,
+        image_format=req.image_format or PREVIEW_FORMAT,
+        trim=PREVIEW_TRIM_MARGINS if req.trim_margins is None else req.trim_margins,
+        skip_blank=PREVIEW_SKIP_BLANK if req.skip_blank_pages is None else req.skip_blank_pages,
+    )
+
+
+def render_pages_tracked(req: RenderRequest, tmpdir: Path) -> Tuple[List[Path], Optional[str]]:
+    """render_pages_versioned z licznikiem renderowań wykonywanych w puli wątków (/health)"""
+    with _RENDER_STATS_LOCK:
+        RENDER_STATS["active"] += 1
+    try:
+        return render_pages_versioned(req, tmpdir)
+    finally:
+        with _RENDER_STATS_LOCK:
+            RENDER_STATS["active"] -= 1
+
+
+def render_stats() -> Dict[str, int]:
+    """
+    Liczniki renderowań dla /health. W trybie local "queued" to requesty przyjęte,
+    ale czekające na wolny wątek puli (in_flight - active); w trybie coordinator
+    kolejkę zadań raportuje pole "jobs".
+    """
+    with _RENDER_STATS_LOCK:
+        stats = dict(RENDER_STATS)
+    if RENDER_MODE != "coordinator":
+        stats["queued"] = max(stats["in_flight"] - stats["active"], 0)
+    return stats
+
+
+def render_pages_versioned(req: RenderRequest, tmpdir: Path) -> Tuple[List[Path], Optional[str]]:
+    """
+    Renderuje lokalnie na wersjach przypiętych w rejestrze (HOT_RELOAD).
+    Bez rejestru - bezpośrednio z TEMPLATES_ROOT/PRODUCTS_ROOT.
+
+    Returns:
+        (lista obrazów stron, wersja szablonu "<szablon>@<id>" lub None)
+    """
+    if TEMPLATE_REGISTRY is None:
+        return render_pages(req, tmpdir), None
+
+    product_ids = [product.product_id for product in req.products]
+    with TEMPLATE_REGISTRY.use(req.template, product_ids) as (template_version, product_versions):
+        page_paths = render_pages(
+            req,
+            tmpdir,
+            template_path=template_version.path,
+            product_dirs={product_id: version.path for product_id, version in product_versions.items()},
+            already_fixed=True,
+        )
+        return page_paths, template_version.label
+
+
+def validate_template_version(version_path: Path, template_name: str) -> None:
+    """
+    Walidacja nowej wersji szablonu przed publikacją (HOT_RELOAD):
+    naprawa tagów Jinja2 w kopii, kompilacja szablonu i opcjonalny render próbny.
+    """
+    main_docx = find_main_docx(version_path)
+
+    # Naprawa w miejscu - błąd odrzuca wersję zamiast cicho użyć oryginału
+    fixed_docx = version_path / f".fixed_{main_docx.name}"
+    fix_jinja_tags_in_docx(main_docx, fixed_docx, strict=True)
+    os.replace(fixed_docx, main_docx)
+
+    # Kompilacja Jinja2 - błąd składni odrzuca wersję
+    try:
+        DocxTemplate(main_docx).get_undeclared_template_variables()
+    except Exception as e:
+        raise ValueError(f"Template {template_name} does not compile: {e}")
+
+    if HOT_RELOAD_WARM_RENDER:
+        req = build_warmup_request(template_name, load_template_config(version_path))
+        if req is not None:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                render_pages(req, Path(tmpdir), template_path=version_path, already_fixed=True)
+
+
+def publish_request_assets(req: RenderRequest) -> Dict[str, str]:
+    """Publikuje szablon i użyte produkty do magazynu artefaktów; zwraca manifest"""
+    manifest = ASSET_PUBLISHER.publish_dir(TEMPLATES_ROOT, req.template, "templates")
+    for product in req.products:
+        if not (PRODUCTS_ROOT / product.product_id).is_dir():
+            raise ValueError(f"Product directory not found: {product.product_id}")
+        manifest.update(ASSET_PUBLISHER.publish_dir(PRODUCTS_ROOT, product.product_id, "products"))
+    return manifest
+
+
+def extract_pages(zip_bytes: bytes, pages_dir: Path) -> List[Path]:
+    """Rozpakowuje obrazy stron z ZIP-a zwróconego przez workera"""
+    with ZipFile(BytesIO(zip_bytes)) as zip_ref:
+        names = sorted(name for name in zip_ref.namelist() if re.fullmatch(r"page_\d+\.(jpg|png|webp|avif)", name))
+        if not names:
+            raise RuntimeError("Render artifact contains no pages")
+        for name in names:
+            zip_ref.extract(name, pages_dir)
+
+    return [pages_dir / name for name in names]
+
+
+async def render_pages_remote(req: RenderRequest, tmpdir: Path) -> List[Path]:
+    """
+    Zleca renderowanie workerom (RENDER_MODE=coordinator).
 
+    Publikuje szablon i użyte produkty do magazynu artefaktów, wrzuca zadanie
+    do kolejki i czeka na ZIP ze stronami, który worker odkłada do magazynu.
 
-def fix_jinja_tags_in_docx(docx_path: Path, output_path: Path) -> Path:
+    Returns:
+        Lista ścieżek do obrazów stron rozpakowanych w tmpdir
+    """
+    # Haszowanie plików i I/O magazynu w threadpoolu, oczekiwanie na workera w pętli asyncio
+    manifest = await run_in_threadpool(publish_request_assets, req)
+
+    job = JOB_QUEUE.submit({"request": req.model_dump(), "manifest": manifest})
+    try:
+        if not await JOB_QUEUE.wait(job, timeout=JOB_TIMEOUT):
+            raise RuntimeError(f"Render job {job.job_id} timed out (>{JOB_TIMEOUT:.0f}s), no worker finished it")
+    finally:
+        JOB_QUEUE.forget(job)
+
+    if job.error:
+        raise RuntimeError(f"Worker {job.worker_id} failed: {job.error}")
+
+    try:
+        zip_bytes = await run_in_threadpool(ARTIFACT_STORE.get_bytes, job.artifact)
+    finally:
+        # Wynik jest potrzebny tylko temu requestowi (unikalny skrót, patrz tag_result_zip)
+        await run_in_threadpool(ARTIFACT_STORE.delete, job.artifact)
+    return await run_in_threadpool(extract_pages, zip_bytes, tmpdir / "pages")
+
+
+def render_pages_cached(req: RenderRequest, tmpdir: Path, cache_root: Path) -> List[Path]:
+    """Renderuje request z kopii szablonu i produktów w cache workera (RENDER_MODE=worker)"""
+    return render_pages(
+        req,
+        tmpdir,
+        template_path=cache_root / "templates" / req.template,
+        product_dirs={product.product_id: cache_root / "products" / product.product_id for product in req.products},
+    )
+
+
+def render_request_to_zip(request_data: Dict[str, Any], cache_root: Path) -> bytes:
+    """Renderuje request zadania (RENDER_MODE=worker) i zwraca ZIP ze stronami"""
+    req = RenderRequest(**request_data)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        return create_zip(render_pages_cached(req, Path(tmpdir), cache_root))
+
+
+def warm_worker(cache_root: Path) -> None:
+    """
+    Warmup workera: najpierw synchronizuje wszystkie szablony i produkty z koordynatora
+    (świeży worker ma pusty cache), potem renderuje syntetyczny request per szablon.
+    """
+    if warmup_enabled():
+        try:
+            manifest = fetch_manifest(COORDINATOR_URLS, API_KEY)
+            fetched = sync_assets(ARTIFACT_STORE, manifest, cache_root)
+            print(f"Warmup: synced {len(manifest)} asset files from coordinator ({fetched} downloaded)")
+        except Exception as e:
+            print(f"Warmup: could not sync assets from coordinator: {e}")
+
+    run_warmup(
+        templates_root=cache_root / "templates",
+        render_fn=lambda req, tmpdir: render_pages_cached(req, tmpdir, cache_root),
+        products_root=cache_root / "products",
+    )
+
+
+def load_template_config(template_path: Path) -> Dict[str, Any]:
+    """
+    Zwraca konfigurację szablonu - pierwszy plik *.json z kluczem "placeholders"
+    (np. oferta1.json, wolftax.json). Pusty słownik, jeśli brak.
+    """
+    for config_file in sorted(template_path.glob("*.json")):
+        try:
+            with open(config_file, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if isinstance(config, dict) and "placeholders" in config:
+            return config
+    return {}
+
+
+def default_warmup_products(config: Dict[str, Any], products_root: Path) -> List[ProductItem]:
+    """
+    Domyślne produkty warmupu: jeśli szablon przyjmuje produkty (sekcja "products"
+    lub "injection_point" w konfiguracji), jeden produkt z pierwszego katalogu
+    w products_root - żeby warmup przeszedł też ścieżkę obrazów produktów (InlineImage).
+    """
+    if "products" not in config and "injection_point" not in config:
+        return []
+    if not products_root.exists():
+        return []
+
+    product_dirs = sorted(
+        (p for p in products_root.iterdir() if p.is_dir() and not p.name.startswith(".")),
+        key=lambda p: (not p.name.isdigit(), int(p.name) if p.name.isdigit() else 0, p.name),
+    )
+    if not product_dirs:
+        return []
+
+    product_dir = product_dirs[0]
+    product_config = load_template_config(product_dir)
+    data = {
+        name: spec["default"]
+        for name, spec in product_config.get("placeholders", {}).items()
+        if isinstance(spec, dict) and "default" in spec and spec.get("type") != "image"
+    }
+
+    # Plik produktu: template_file z config.json, w przeciwnym razie pierwszy plik katalogu
+    image = product_config.get("template_file")
+    if not image:
+        files = sorted(p.name for p in product_dir.iterdir() if p.is_file() and p.suffix.lower() != ".json")
+        image = files[0] if files else None
+
+    return [ProductItem(product_id=product_dir.name, image=image, data=data)]
+
+
+def build_warmup_request(
+    template_name: str,
+    config: Dict[str, Any],
+    products_root: Optional[Path] = None,
+) -> Optional[RenderRequest]:
+    """
+    Buduje syntetyczny request dla warmupu szablonu.
+
+    Sekcja "warmup" w konfiguracji szablonu:
+        false                                    - pomiń szablon
+        {"placeholders": {...}, "products": [...]} - użyj podanych danych
+    Bez sekcji placeholdery wypełniane są ich etykietami z konfiguracji,
+    a produkty - patrz default_warmup_products.
+    """
+    warmup_config = config.get("warmup", {})
+    if warmup_config is False or (isinstance(warmup_config, dict) and warmup_config.get("enabled") is False):
+        return None
+    if not isinstance(warmup_config, dict):
+        warmup_config = {}
+
+    placeholders = warmup_config.get("placeholders")
+    if placeholders is None:
+        placeholders = {
+            name: (spec.get("label", name) if isinstance(spec, dict) else name)
+            for name, spec in config.get("placeholders", {}).items()
+        }
+
+    return RenderRequest(
+        template=template_name,
+        placeholders=placeholders,
+        products=(
+            warmup_config["products"] if "products" in warmup_config
+            else default_warmup_products(config, products_root or PRODUCTS_ROOT)
+        ),
+        return_mode="zip",
+    )
+
+
+def warmup_enabled() -> bool:
+    return WARMUP.lower() not in ("", "none", "off", "0", "false")
+
+
+def run_warmup(
+    templates_root: Optional[Path] = None,
+    render_fn: Optional[Callable[[RenderRequest, Path], List[Path]]] = None,
+    products_root: Optional[Path] = None,
+) -> None:
+    """
+    Warmup przy starcie procesu (WARMUP=all lub lista szablonów).
+
+    - local/worker: renderuje syntetyczny request per szablon end-to-end
+      (docxtpl, LibreOffice, PyMuPDF) i wypełnia cache naprawionych szablonów
+    - coordinator: publikuje szablony do magazynu artefaktów (skróty + upload)
+
+    Args:
+        templates_root: Katalog szablonów (domyślnie TEMPLATES_ROOT; worker: cache workera)
+        render_fn: Funkcja (request, tmpdir) → obrazy stron (domyślnie render_pages_versioned)
+        products_root: Katalog produktów dla domyślnych produktów warmupu (domyślnie PRODUCTS_ROOT)
+    """
+    WARMUP_STATE["status"] = "warming"
+    started = time.time()
+    templates_root = templates_root or TEMPLATES_ROOT
+    render_fn = render_fn or (lambda req, tmpdir: render_pages_versioned(req, tmpdir)[0])
+
+    if not warmup_enabled():
+        selected: List[str] = []
+    elif WARMUP.lower() in ("all", "on", "1", "true"):
+        selected = sorted(p.name for p in templates_root.iterdir() if p.is_dir()) if templates_root.exists() else []
+    else:
+        selected = [name.strip() for name in WARMUP.split(",") if name.strip()]
+
+    for template_name in selected:
+        template_started = time.time()
+        result: Dict[str, Any] = {"status": "ok"}
+        template_path = templates_root / template_name
+
+        try:
+            if not template_path.is_dir():
+                raise ValueError(f"Template folder not found: {template_name}")
+
+            if RENDER_MODE == "coordinator":
+                ASSET_PUBLISHER.publish_dir(TEMPLATES_ROOT, template_name, "templates")
+            else:
+                req = build_warmup_request(template_name, load_template_config(template_path), products_root)
+                if req is None:
+                    result["status"] = "skipped"
+                else:
+                    with tempfile.TemporaryDirectory() as tmpdir:
+                        result["pages"] = len(render_fn(req, Path(tmpdir)))
+        except Exception as e:
+            result = {"status": "failed", "error": str(e)}
+
+        result["seconds"] = round(time.time() - template_started, 3)
+        WARMUP_STATE["templates"][template_name] = result
+        print(f"Warmup {template_name}: {result['status']} ({result['seconds']}s)")
+
+    WARMUP_STATE["seconds"] = round(time.time() - started, 3)
+    WARMUP_STATE["status"] = "ready"
+
+
+def get_fixed_template(docx_path: Path, tmpdir: Path) -> Path:
+    """
+    Zwraca kopię szablonu z naprawionymi tagami Jinja2 w tmpdir.
+
+    Wynik fix_jinja_tags_in_docx jest cache'owany w pamięci po (mtime, size),
+    więc naprawa wykonywana jest raz na wersję pliku, a nie przy każdym żądaniu.
+    """
+    stat = docx_path.stat()
+    key = docx_path.absolute()
+    output_path = tmpdir / f"fixed_{docx_path.name}"
+
+    with _FIXED_TEMPLATE_LOCK:
+        cached = _FIXED_TEMPLATE_CACHE.get(key)
+
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        output_path.write_bytes(cached[2])
+        return output_path
+
+    fix_jinja_tags_in_docx(docx_path, output_path)
+    with _FIXED_TEMPLATE_LOCK:
+        _FIXED_TEMPLATE_CACHE[key] = (stat.st_mtime_ns, stat.st_size, output_path.read_bytes())
+
+    return output_path
+
+
+def fix_jinja_tags_in_docx(docx_path: Path, output_path: Path, strict: bool = False) -> Path:
     """
     Naprawia rozbite tagi Jinja2 w pliku DOCX.
 
@@ -182,6 +854,7 @@ def fix_jinja_tags_in_docx(docx_path: Path, output_path: Path) -> Path:
     Args:
         docx_path: Ścieżka do oryginalnego DOCX
         output_path: Ścieżka do naprawionego DOCX
+        strict: Rzuć wyjątek zamiast kopiować oryginał, jeśli naprawa się nie uda
 
     Returns:
         Ścieżka do naprawionego pliku
@@ -251,9 +924,10 @@ def fix_jinja_tags_in_docx(docx_path: Path, output_path: Path) -> Path:
 
                         with open(xml_file, 'w', encoding='utf-8') as f:
                             f.write(content)
-                    except Exception:
+                    except Exception as e:
+                        if strict:
+                            raise ValueError(f"{xml_file.name}: {e}")
                         # Jeśli któryś plik się nie uda, kontynuuj
-                        pass
 
             # Zapakuj z powrotem do DOCX
             with ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
@@ -265,15 +939,27 @@ def fix_jinja_tags_in_docx(docx_path: Path, output_path: Path) -> Path:
         return output_path
 
     except Exception as e:
+        if strict:
+            raise ValueError(f"Could not repair Jinja2 tags in {docx_path.name}: {e}")
+
         # Jeśli naprawa się nie uda, zwróć oryginalny plik
         shutil.copy(docx_path, output_path)
         return output_path
 
 
-def prepare_context(placeholders: Dict[str, Any], products: List[ProductItem]) -> Dict[str, Any]:
+def prepare_context(
+    placeholders: Dict[str, Any],
+    products: List[ProductItem],
+    product_dirs: Optional[Dict[str, Path]] = None,
+) -> Dict[str, Any]:
     """
     Przygotowuje kontekst dla docxtpl.
 
+    Args:
+        placeholders: Wartości placeholderów
+        products: Lista produktów
+        product_dirs: {product_id: katalog} (domyślnie PRODUCTS_ROOT/<product_id>)
+
     Returns:
         {
             "data": placeholders,
@@ -286,7 +972,10 @@ def prepare_context(placeholders: Dict[str, Any], products: List[ProductItem]) -
         product_dict = product.model_dump()
 
         # Znajdź obraz produktu
-        product_dir = PRODUCTS_ROOT / product.product_id
+        if product_dirs is not None and product.product_id in product_dirs:
+            product_dir = product_dirs[product.product_id]
+        else:
+            product_dir = PRODUCTS_ROOT / product.product_id
         if not product_dir.exists():
             raise ValueError(f"Product directory not found: {product.product_id}")
 
@@ -308,24 +997,11 @@ def prepare_context(placeholders: Dict[str, Any], products: List[ProductItem]) -
     }
 
 
-def render_template(template_path: Path, context: Dict[str, Any], tmpdir: Path) -> Path:
+def find_main_docx(template_path: Path) -> Path:
     """
-    Renderuje szablon DOCX używając docxtpl.
-
-    Args:
-        template_path: Ścieżka do folderu szablonu
-        context: Kontekst dla docxtpl (data + products)
-        tmpdir: Katalog tymczasowy
-
-    Returns:
-        Ścieżka do wyrenderowanego pliku DOCX
+    Zwraca główny plik DOCX szablonu.
+    Priorytet: oferta1.docx, wolftax.docx, Dok1.docx, lub pierwszy *.docx
     """
-
-    # Sprawdź czy to szablon jednoplikowy czy wieloplikowy
-    config_files = list(template_path.glob("*.json"))
-
-    # Znajdź główny plik DOCX
-    # Priorytet: oferta1.docx, wolftax.docx, lub pierwszy *.docx
     docx_files = list(template_path.glob("*.docx"))
     if not docx_files:
         raise ValueError(f"No DOCX files found in template: {template_path}")
@@ -341,9 +1017,26 @@ def render_template(template_path: Path, context: Dict[str, Any], tmpdir: Path)
     if not main_docx:
         main_docx = docx_files[0]
 
-    # Napraw rozbite tagi Jinja2 w DOCX
-    fixed_docx = tmpdir / f"fixed_{main_docx.name}"
-    fixed_docx = fix_jinja_tags_in_docx(main_docx, fixed_docx)
+    return main_docx
+
+
+def render_template(template_path: Path, context: Dict[str, Any], tmpdir: Path, already_fixed: bool = False) -> Path:
+    """
+    Renderuje szablon DOCX używając docxtpl.
+
+    Args:
+        template_path: Ścieżka do folderu szablonu
+        context: Kontekst dla docxtpl (data + products)
+        tmpdir: Katalog tymczasowy
+        already_fixed: Tagi Jinja2 już naprawione (wersja z rejestru HOT_RELOAD)
+
+    Returns:
+        Ścieżka do wyrenderowanego pliku DOCX
+    """
+    main_docx = find_main_docx(template_path)
+
+    # Napraw rozbite tagi Jinja2 w DOCX (z cache)
+    fixed_docx = main_docx if already_fixed else get_fixed_template(main_docx, tmpdir)
 
     # Renderuj szablon
     doc = DocxTemplate(fixed_docx)
@@ -381,7 +1074,8 @@ def render_template(template_path: Path, context: Dict[str, Any], tmpdir: Path)
 
 def convert_docx_to_pdf(docx_path: Path, tmpdir: Path) -> Path:
     """
-    Konwertuje DOCX → PDF używając LibreOffice headless.
+    Konwertuje DOCX → PDF używając LibreOffice headless
+    (lub konwertera zastępczego przy CONVERTER_BACKEND=fake).
 
     Args:
         docx_path: Ścieżka do pliku DOCX
@@ -390,6 +1084,15 @@ def convert_docx_to_pdf(docx_path: Path, tmpdir: Path) -> Path:
     Returns:
         Ścieżka do pliku PDF
     """
+    if CONVERTER_BACKEND == "fake":
+        return fake_convert_docx_to_pdf(
+            docx_path,
+            tmpdir,
+            latency_ms=FAKE_CONVERTER_LATENCY_MS,
+            jitter_ms=FAKE_CONVERTER_JITTER_MS,
+            concurrency=FAKE_CONVERTER_CONCURRENCY,
+        )
+
     try:
         subprocess.run(
             [
@@ -416,20 +1119,31 @@ def convert_docx_to_pdf(docx_path: Path, tmpdir: Path) -> Path:
     return pdf_path
 
 
-def convert_pdf_to_jpg(pdf_path: Path, tmpdir: Path, dpi: int = 100, quality: int = 85) -> List[Path]:
+def convert_pdf_to_images(
+    pdf_path: Path,
+    tmpdir: Path,
+    dpi: int = 100,
+    quality: int = 85,
+    image_format: str = "jpeg",
+    trim: bool = False,
+    skip_blank: bool = False,
+) -> List[Path]:
     """
-    Konwertuje PDF → JPG używając PyMuPDF.
+    Konwertuje PDF → obrazy stron używając PyMuPDF + post-processingu NumPy.
 
     Args:
         pdf_path: Ścieżka do pliku PDF
-        tmpdir: Katalog tymczasowy dla plików JPG
+        tmpdir: Katalog tymczasowy dla obrazów
         dpi: Rozdzielczość w DPI (domyślnie 100)
-        quality: Jakość JPEG 0-100 (domyślnie 85)
+        quality: Jakość kodeków stratnych 0-100 (domyślnie 85)
+        image_format: "jpeg" (progresywny), "png", "webp", "avif" lub "auto"
+        trim: Przycinanie białych marginesów
+        skip_blank: Pomijanie pustych stron (numeracja plików pozostaje oryginalna)
 
     Returns:
-        Lista ścieżek do plików JPG (page_001.jpg, page_002.jpg, ...)
+        Lista ścieżek do obrazów (page_001.jpg, page_002.png, ...)
     """
-    jpg_paths = []
+    page_paths = []
 
     try:
         pdf_doc = fitz.open(pdf_path)
@@ -442,30 +1156,60 @@ def convert_pdf_to_jpg(pdf_path: Path, tmpdir: Path, dpi: int = 100, quality: in
             matrix = fitz.Matrix(zoom, zoom)
             pix = page.get_pixmap(matrix=matrix, alpha=False)
 
-            # Konwertuj pixmap → PIL Image
-            # pix.samples to raw bytes RGB, więc używamy Image.frombytes
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+            # Pixmap → widok NumPy na bufor pix (bez kopiowania) i klasyfikacja strony
+            arr = pixmap_to_array(pix)
+            stats = analyze_page(arr)
+
+            # Zawsze zostaw co najmniej jedną stronę (first_page_inline)
+            if skip_blank and stats["blank"] and (page_paths or page_num < len(pdf_doc) - 1):
+                continue
+
+            if trim and not stats["blank"]:
+                arr = trim_margins(arr, stats["bbox"])
 
-            # Zapisz jako JPEG z odpowiednią jakością i DPI
-            jpg_path = tmpdir / f"page_{page_num + 1:03d}.jpg"
-            img.save(jpg_path, "JPEG", quality=quality, dpi=(dpi, dpi))
+            codec = choose_codec(image_format, stats)
+            page_path = encode_page(
+                arr, codec, tmpdir / f"page_{page_num + 1:03d}", dpi=dpi, quality=quality,
+                palette=use_palette(image_format, stats)
+            )
 
-            jpg_paths.append(jpg_path)
+            page_paths.append(page_path)
 
         pdf_doc.close()
 
     except Exception as e:
-        raise RuntimeError(f"Error converting PDF to JPG: {str(e)}")
-
-    return jpg_paths
+        raise RuntimeError(f"Error converting PDF to images: {str(e)}")
+
+    return page_paths
+
+
+def build_render_response(req: RenderRequest, page_paths: List[Path], version_headers: Dict[str, str]) -> Response:
+    """Buduje odpowiedź /render: pierwsza strona jako obraz albo ZIP ze wszystkimi stronami"""
+    if req.return_mode == "first_page_inline":
+        # Zwróć tylko pierwszą stronę jako obraz
+        with open(page_paths[0], "rb") as f:
+            image_data = f.read()
+        media_type = MEDIA_TYPES[page_paths[0].suffix.lstrip(".")]
+        return Response(content=image_data, media_type=media_type, headers=version_headers)
+
+    # Zwróć wszystkie strony jako ZIP
+    zip_buffer = create_zip(page_paths)
+    return StreamingResponse(
+        BytesIO(zip_buffer),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename=offer_{req.template}.zip",
+            **version_headers
+        }
+    )
 
 
-def create_zip(jpg_paths: List[Path]) -> bytes:
+def create_zip(page_paths: List[Path]) -> bytes:
     """
-    Tworzy archiwum ZIP z plików JPG.
+    Tworzy archiwum ZIP z obrazów stron.
 
     Args:
-        jpg_paths: Lista ścieżek do plików JPG
+        page_paths: Lista ścieżek do obrazów stron
 
     Returns:
         Zawartość pliku ZIP jako bytes
@@ -473,8 +1217,8 @@ def create_zip(jpg_paths: List[Path]) -> bytes:
     zip_buffer = BytesIO()
 
     with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-        for jpg_path in jpg_paths:
-            zip_file.write(jpg_path, arcname=jpg_path.name)
+        for page_path in page_paths:
+            zip_file.write(page_path, arcname=page_path.name)
 
     return zip_buffer.getvalue()
 
@@ -483,9 +1227,25 @@ def create_zip(jpg_paths: List[Path]) -> bytes:
 if __name__ == "__main__":
     import uvicorn
 
-    print(f"Starting Offer Rendering API on {HOST}:{PORT}")
+    if RENDER_MODE == "worker":
+        if not check_converter():
+            raise SystemExit("LibreOffice not found. Render workers require LibreOffice (or CONVERTER_BACKEND=fake).")
+
+        warm_worker(prepare_worker_cache(WORKER_CACHE_ROOT))
+
+        run_worker(
+            coordinator_urls=COORDINATOR_URLS,
+            api_key=API_KEY,
+            store=ARTIFACT_STORE,
+            cache_root=WORKER_CACHE_ROOT,
+            render_fn=render_request_to_zip,
+        )
+        raise SystemExit(0)
+
+    print(f"Starting Offer Rendering API on {HOST}:{PORT} (RENDER_MODE={RENDER_MODE})")
     print(f"TEMPLATES_ROOT: {TEMPLATES_ROOT.absolute()}")
     print(f"PRODUCTS_ROOT: {PRODUCTS_ROOT.absolute()}")
-    print(f"DPI: {DPI}, JPEG_QUALITY: {JPEG_QUALITY}")
+    print(f"DPI: {DPI}, JPEG_QUALITY: {JPEG_QUALITY}, PREVIEW_FORMAT: {PREVIEW_FORMAT}")
+    print(f"WARMUP: {WARMUP}")
 
     uvicorn.run(app, host=HOST, port=PORT)
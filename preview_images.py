@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Post-processing podglądów stron (pixmapa PyMuPDF jako tablica NumPy).
+
+- wykrywanie pustych / prawie pustych stron
+- przycinanie marginesów
+- wybór kodeka per strona: w trybie auto paletowy PNG dla stron tekstowych
+  i WebP dla stron ze zdjęciami; jawnie PNG (bezstratny), WebP/AVIF lub progresywny JPEG
+"""
+
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+import numpy as np
+from PIL import Image
+
+try:
+    import pillow_avif  # noqa: F401  (rejestruje kodek AVIF w Pillow < 11)
+except ImportError:
+    pass
+
+
+# Formaty podglądów akceptowane w RenderRequest.image_format / PREVIEW_FORMAT
+PREVIEW_FORMATS = ("jpeg", "png", "webp", "avif", "auto")
+
+MEDIA_TYPES = {
+    "jpg": "image/jpeg",
+    "png": "image/png",
+    "webp": "image/webp",
+    "avif": "image/avif",
+}
+
+# Piksel jest "tuszem", jeśli którykolwiek kanał jest ciemniejszy niż próg
+INK_THRESHOLD = 245
+# Strona jest pusta, jeśli tusz zajmuje mniej niż ten ułamek powierzchni
+BLANK_INK_RATIO = 0.0005
+# Piksel jest "kolorowy", jeśli rozpiętość kanałów przekracza próg
+COLOR_SPREAD = 32
+# Strona jest "zdjęciowa" powyżej tego udziału kolorowych pikseli lub liczby kolorów
+PHOTO_COLOR_RATIO = 0.04
+PHOTO_UNIQUE_COLORS = 1024
+
+
+def pixmap_to_array(pix) -> np.ndarray:
+    """
+    Zamienia fitz.Pixmap (RGB, bez alfy) na tablicę HxWx3 uint8 bez kopiowania danych.
+
+    Tablica jest widokiem na bufor pixmapy przez pix.samples_mv (pix.samples
+    zwraca kopię bajtów) - wywołujący musi trzymać referencję do pix,
+    dopóki używa tablicy.
+    """
+    rows = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.stride)
+    return rows[:, : pix.width * pix.n].reshape(pix.height, pix.width, pix.n)[:, :, :3]
+
+
+def analyze_page(arr: np.ndarray) -> Dict[str, Any]:
+    """
+    Klasyfikuje stronę.
+
+    Returns:
+        {
+            "blank": bool,        # prawie brak tuszu
+            "photo": bool,        # dużo kolorowych pikseli / kolorów
+            "ink_ratio": float,
+            "bbox": (top, bottom, left, right) lub None  # obszar z tuszem
+        }
+    """
+    ink = arr.min(axis=2) < INK_THRESHOLD
+    ink_ratio = float(ink.mean())
+
+    rows = np.flatnonzero(ink.any(axis=1))
+    cols = np.flatnonzero(ink.any(axis=0))
+    bbox = (int(rows[0]), int(rows[-1]) + 1, int(cols[0]), int(cols[-1]) + 1) if rows.size else None
+
+    # Analiza kolorów na próbce co 4. piksel - wystarczy do klasyfikacji
+    sample = arr[::4, ::4].astype(np.int16)
+    spread = sample.max(axis=2) - sample.min(axis=2)
+    color_ratio = float((spread > COLOR_SPREAD).mean())
+
+    quantized = (sample >> 3).reshape(-1, 3)
+    packed = (quantized[:, 0] << 10) | (quantized[:, 1] << 5) | quantized[:, 2]
+    unique_colors = int(np.unique(packed).size)
+
+    return {
+        "blank": ink_ratio < BLANK_INK_RATIO,
+        "photo": color_ratio > PHOTO_COLOR_RATIO or unique_colors > PHOTO_UNIQUE_COLORS,
+        "ink_ratio": ink_ratio,
+        "bbox": bbox,
+    }
+
+
+def trim_margins(arr: np.ndarray, bbox: Optional[tuple], padding: int = 16) -> np.ndarray:
+    """Przycina białe marginesy do obszaru z tuszem (z zachowaniem paddingu)"""
+    if bbox is None:
+        return arr
+
+    top, bottom, left, right = bbox
+    height, width = arr.shape[:2]
+    return arr[
+        max(top - padding, 0): min(bottom + padding, height),
+        max(left - padding, 0): min(right + padding, width),
+    ]
+
+
+def avif_supported() -> bool:
+    """Czy Pillow potrafi zapisywać AVIF (natywnie lub przez pillow-avif-plugin)"""
+    Image.init()
+    return "AVIF" in Image.SAVE
+
+
+def choose_codec(image_format: str, stats: Dict[str, Any]) -> str:
+    """
+    Wybiera kodek dla strony.
+
+    auto: PNG (paletowy, patrz use_palette) dla stron tekstowych i pustych,
+    WebP dla stron ze zdjęciami.
+    avif: AVIF, jeśli dostępny, w przeciwnym razie WebP.
+    """
+    if image_format == "auto":
+        return "webp" if stats["photo"] and not stats["blank"] else "png"
+    if image_format == "avif":
+        return "avif" if avif_supported() else "webp"
+    if image_format == "jpeg":
+        return "jpg"
+    return image_format
+
+
+def use_palette(image_format: str, stats: Dict[str, Any]) -> bool:
+    """Paletowy PNG tylko w trybie auto i tylko dla stron bez zdjęć - jawne "png" jest bezstratne"""
+    return image_format == "auto" and not stats["photo"]
+
+
+def encode_page(
+    arr: np.ndarray,
+    codec: str,
+    output_base: Path,
+    dpi: int = 100,
+    quality: int = 85,
+    palette: bool = False,
+) -> Path:
+    """
+    Koduje stronę do pliku output_base.<rozszerzenie>.
+
+    Args:
+        arr: Strona jako tablica HxWx3 uint8
+        codec: "jpg" (progresywny), "png", "webp" lub "avif"
+        output_base: Ścieżka bez rozszerzenia (np. tmpdir/page_001)
+        dpi: DPI zapisywane w metadanych
+        quality: Jakość dla kodeków stratnych
+        palette: PNG z paletą 64 kolorów zamiast bezstratnego RGB
+
+    Returns:
+        Ścieżka do zapisanego pliku
+    """
+    img = Image.fromarray(np.ascontiguousarray(arr), "RGB")
+    output_path = output_base.with_suffix(f".{codec}")
+
+    if codec == "jpg":
+        img.save(output_path, "JPEG", quality=quality, dpi=(dpi, dpi), progressive=True, optimize=True)
+    elif codec == "png" and palette:
+        # Strony tekstowe mają niewiele kolorów - paleta 64 kolorów bez ditheringu
+        palette_img = img.quantize(colors=64, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE)
+        palette_img.save(output_path, "PNG", optimize=True, dpi=(dpi, dpi))
+    elif codec == "png":
+        img.save(output_path, "PNG", optimize=True, dpi=(dpi, dpi))
+    elif codec == "webp":
+        img.save(output_path, "WEBP", quality=quality, method=4)
+    elif codec == "avif":
+        img.save(output_path, "AVIF", quality=quality)
+    else:
+        raise ValueError(f"Unknown preview codec: {codec}")
+
+    return output_path
@@ -0,0 +1,616 @@
+#!/usr/bin/env python3
+"""
+Tryb rozproszony (render farm) dla offer_api.py.
+
+- coordinator: front-end HTTP przyjmuje /render i wrzuca zadania do kolejki
+- worker: proces na innym hoście (z LibreOffice) pobiera zadania z koordynatora
+- artefakty i pliki szablonów/produktów trafiają do współdzielonego magazynu
+  adresowanego treścią (SHA-256): system plików lub S3 (np. MinIO)
+"""
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import tempfile
+import threading
+import urllib.request
+import urllib.error
+import zipfile
+from abc import ABC, abstractmethod
+from collections import deque
+from io import BytesIO
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Callable, Tuple
+
+
+# ========== MAGAZYN ARTEFAKTÓW ==========
+
+def sha256_bytes(data: bytes) -> str:
+    """Zwraca skrót SHA-256 (hex) dla danych"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_file(path: Path) -> str:
+    """Zwraca skrót SHA-256 (hex) dla pliku, czytając go blokami"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FileDigestCache:
+    """Cache skrótów SHA-256 plików po (mtime, size) - bez ponownego haszowania niezmienionych plików"""
+
+    def __init__(self):
+        self._cache: Dict[Path, Tuple[int, int, str]] = {}
+        self._lock = threading.Lock()
+
+    def digest(self, path: Path) -> str:
+        stat = path.stat()
+        with self._lock:
+            cached = self._cache.get(path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+
+        digest = sha256_file(path)
+        self.remember(path, digest)
+        return digest
+
+    def remember(self, path: Path, digest: str) -> None:
+        """Zapisuje znany skrót pliku (np. zaraz po pobraniu go z magazynu)"""
+        stat = path.stat()
+        with self._lock:
+            self._cache[path] = (stat.st_mtime_ns, stat.st_size, digest)
+
+
+class ArtifactStore(ABC):
+    """
+    Magazyn adresowany treścią. Klucz obiektu to skrót SHA-256 jego zawartości,
+    więc zapis jest idempotentny, a obiekty są niezmienne.
+    """
+
+    @abstractmethod
+    def exists(self, digest: str) -> bool:
+        """Czy obiekt o danym skrócie jest w magazynie"""
+
+    @abstractmethod
+    def get_bytes(self, digest: str) -> bytes:
+        """Zwraca zawartość obiektu; KeyError, jeśli go nie ma"""
+
+    @abstractmethod
+    def _put(self, digest: str, data: bytes) -> None:
+        """Zapisuje obiekt pod danym skrótem"""
+
+    @abstractmethod
+    def delete(self, digest: str) -> None:
+        """Usuwa obiekt (brak obiektu nie jest błędem)"""
+
+    def put_bytes(self, data: bytes) -> str:
+        """Zapisuje dane i zwraca ich skrót (pomija zapis, jeśli obiekt już jest)"""
+        digest = sha256_bytes(data)
+        if not self.exists(digest):
+            self._put(digest, data)
+        return digest
+
+    def put_file(self, path: Path) -> str:
+        """Zapisuje plik i zwraca jego skrót"""
+        with open(path, "rb") as f:
+            return self.put_bytes(f.read())
+
+    def fetch_to(self, digest: str, dest: Path) -> Path:
+        """
+        Pobiera obiekt do pliku dest. Zapis przez plik tymczasowy + os.replace,
+        żeby równoległy odczyt nigdy nie zobaczył połowy pliku.
+        """
+        data = self.get_bytes(digest)
+        if sha256_bytes(data) != digest:
+            raise RuntimeError(f"Artifact {digest} is corrupted in the store")
+
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=dest.parent, prefix=f".{dest.name}.")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_name, dest)
+        except Exception:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+        return dest
+
+
+class FilesystemArtifactStore(ArtifactStore):
+    """Magazyn na (współdzielonym) systemie plików: <root>/<ab>/<sha256>"""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def exists(self, digest: str) -> bool:
+        return self._path(digest).exists()
+
+    def get_bytes(self, digest: str) -> bytes:
+        path = self._path(digest)
+        if not path.exists():
+            raise KeyError(f"Artifact not found in store: {digest}")
+        return path.read_bytes()
+
+    def _put(self, digest: str, data: bytes) -> None:
+        path = self._path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{digest}.")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_name, path)
+        except Exception:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+
+    def delete(self, digest: str) -> None:
+        self._path(digest).unlink(missing_ok=True)
+
+
+class S3ArtifactStore(ArtifactStore):
+    """
+    Magazyn w buckecie S3 (lub kompatybilnym, np. MinIO).
+    Dane dostępowe boto3 bierze ze standardowych zmiennych AWS_*.
+    """
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("S3 artifact store requires boto3. Install: pip install boto3")
+
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.client = boto3.client("s3", endpoint_url=endpoint_url or None)
+
+    def _key(self, digest: str) -> str:
+        key = f"{digest[:2]}/{digest}"
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def exists(self, digest: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(digest))
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def get_bytes(self, digest: str) -> bytes:
+        from botocore.exceptions import ClientError
+
+        try:
+            obj = self.client.get_object(Bucket=self.bucket, Key=self._key(digest))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                raise KeyError(f"Artifact not found in store: {digest}")
+            raise
+        return obj["Body"].read()
+
+    def _put(self, digest: str, data: bytes) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self._key(digest), Body=data)
+
+    def delete(self, digest: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(digest))
+
+
+def create_artifact_store() -> ArtifactStore:
+    """
+    Tworzy magazyn na podstawie zmiennych środowiskowych:
+        ARTIFACT_STORE=fs|s3
+        ARTIFACT_STORE_ROOT (fs), S3_BUCKET / S3_PREFIX / S3_ENDPOINT_URL (s3)
+    """
+    backend = os.getenv("ARTIFACT_STORE", "fs").lower()
+
+    if backend == "fs":
+        return FilesystemArtifactStore(Path(os.getenv("ARTIFACT_STORE_ROOT", "artifacts")))
+    if backend == "s3":
+        bucket = os.getenv("S3_BUCKET")
+        if not bucket:
+            raise RuntimeError("ARTIFACT_STORE=s3 requires S3_BUCKET")
+        return S3ArtifactStore(
+            bucket=bucket,
+            prefix=os.getenv("S3_PREFIX", "offer-artifacts"),
+            endpoint_url=os.getenv("S3_ENDPOINT_URL"),
+        )
+
+    raise RuntimeError(f"Unknown ARTIFACT_STORE backend: {backend} (expected 'fs' or 's3')")
+
+
+# ========== SYNCHRONIZACJA SZABLONÓW I PRODUKTÓW ==========
+
+# Plik-znacznik katalogu cache workera; sync_assets usuwa pliki tylko w takim katalogu
+WORKER_CACHE_MARKER = ".offer-worker-cache"
+
+
+class AssetPublisher:
+    """
+    Publikuje pliki szablonów/produktów do magazynu i buduje manifest
+    {ścieżka_względna: sha256}. Skróty są cache'owane po (mtime, size),
+    żeby nie haszować tych samych plików przy każdym żądaniu.
+
+    Obecność obiektu w magazynie jest ponownie sprawdzana po `verify_seconds`,
+    więc po wyczyszczeniu magazynu pliki zostaną wgrane ponownie.
+    """
+
+    def __init__(self, store: ArtifactStore, verify_seconds: float = 60.0):
+        self.store = store
+        self.verify_seconds = verify_seconds
+        self.digests = FileDigestCache()
+        self._verified: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def publish_dir(self, root: Path, rel_dir: str, prefix: str) -> Dict[str, str]:
+        """
+        Publikuje wszystkie pliki z root/rel_dir.
+
+        Returns:
+            Manifest {"<prefix>/<rel_dir>/<plik>": sha256}
+        """
+        manifest = {}
+        base = root / rel_dir
+
+        with self._lock:
+            for file_path in sorted(base.rglob("*")):
+                if not file_path.is_file() or file_path.name.startswith("."):
+                    continue
+
+                digest = self.digests.digest(file_path)
+                now = time.time()
+                if now - self._verified.get(digest, 0.0) > self.verify_seconds:
+                    if not self.store.exists(digest):
+                        self.store.put_file(file_path)
+                    self._verified[digest] = now
+
+                rel = file_path.relative_to(root).as_posix()
+                manifest[f"{prefix}/{rel}"] = digest
+
+        return manifest
+
+    def publish_all(self, root: Path, prefix: str) -> Dict[str, str]:
+        """Publikuje wszystkie katalogi z root (np. wszystkie szablony)"""
+        manifest = {}
+        if root.exists():
+            for entry in sorted(root.iterdir()):
+                if entry.is_dir() and not entry.name.startswith("."):
+                    manifest.update(self.publish_dir(root, entry.name, prefix))
+        return manifest
+
+
+def prepare_worker_cache(cache_root: Path) -> Path:
+    """
+    Przygotowuje katalog cache workera (oznaczony plikiem-znacznikiem).
+    Odmawia użycia niepustego katalogu bez znacznika, żeby synchronizacja
+    nigdy nie usunęła plików z prawdziwego checkoutu szablonów.
+    """
+    cache_root = Path(cache_root)
+    marker = cache_root / WORKER_CACHE_MARKER
+
+    if cache_root.exists() and not marker.exists() and any(cache_root.iterdir()):
+        raise RuntimeError(
+            f"{cache_root} is not empty and is not a worker cache directory. "
+            f"Point WORKER_CACHE_ROOT at a dedicated (empty) directory."
+        )
+
+    cache_root.mkdir(parents=True, exist_ok=True)
+    marker.touch()
+    return cache_root
+
+
+def sync_assets(
+    store: ArtifactStore,
+    manifest: Dict[str, str],
+    cache_root: Path,
+    digests: Optional[FileDigestCache] = None,
+) -> int:
+    """
+    Synchronizuje cache workera z manifestem (po skrótach).
+    Pobiera tylko pliki, których skrót się różni, i usuwa z synchronizowanych
+    katalogów pliki spoza manifestu.
+
+    Args:
+        store: Magazyn artefaktów
+        manifest: {"templates/<szablon>/<plik>": sha256, "products/<id>/<plik>": sha256}
+        cache_root: Katalog cache workera (przygotowany przez prepare_worker_cache)
+        digests: Cache skrótów lokalnych plików
+
+    Returns:
+        Liczba pobranych plików
+    """
+    if not (cache_root / WORKER_CACHE_MARKER).exists():
+        raise RuntimeError(f"{cache_root} is not a worker cache directory (missing {WORKER_CACHE_MARKER})")
+
+    digests = digests or FileDigestCache()
+    fetched = 0
+    synced_dirs: Dict[Path, set] = {}
+
+    for key, digest in manifest.items():
+        parts = Path(key).parts
+        if len(parts) < 3 or parts[0] not in ("templates", "products") or ".." in parts:
+            raise ValueError(f"Invalid asset path in manifest: {key}")
+
+        local_path = cache_root.joinpath(*parts)
+        # Katalog szablonu/produktu (np. templates/<szablon>) jest synchronizowany w całości
+        synced_dirs.setdefault(cache_root / parts[0] / parts[1], set()).add(local_path)
+
+        if local_path.exists() and digests.digest(local_path) == digest:
+            continue
+
+        store.fetch_to(digest, local_path)
+        digests.remember(local_path, digest)
+        fetched += 1
+
+    for top_dir, expected in synced_dirs.items():
+        for file_path in top_dir.rglob("*"):
+            if file_path.is_file() and file_path not in expected:
+                file_path.unlink()
+
+    return fetched
+
+
+# ========== KOLEJKA ZADAŃ (KOORDYNATOR) ==========
+
+class RenderJob:
+    """Zadanie renderowania oczekujące na wynik z workera"""
+
+    def __init__(self, payload: Dict[str, Any], future: "asyncio.Future"):
+        self.job_id = uuid.uuid4().hex
+        self.payload = payload
+        self.created_at = time.time()
+        self.claimed_at: Optional[float] = None
+        self.worker_id: Optional[str] = None
+        self.artifact: Optional[str] = None
+        self.error: Optional[str] = None
+        self.future = future
+
+    @property
+    def done(self) -> bool:
+        return self.future.done()
+
+
+class JobQueue:
+    """
+    Kolejka zadań w pamięci koordynatora, obsługiwana w pętli asyncio.
+    Oczekiwanie na wynik (/render) i long-polling workerów (/jobs/claim)
+    nie blokują wątków threadpoola. Zadania nieodebrane w czasie lease
+    wracają do kolejki. Wszystkie metody poza stats() wywołuje się z pętli.
+
+    Kolejka nie jest współdzielona: każdy front-end ma własną, więc worker
+    musi odpytywać wszystkie koordynatory (run_worker z listą URL-i),
+    a restart koordynatora gubi jego zadania oczekujące i w toku.
+    """
+
+    def __init__(self, lease_seconds: float = 120.0):
+        self.lease_seconds = lease_seconds
+        self._pending: deque = deque()
+        self._jobs: Dict[str, RenderJob] = {}
+        self._waiters: deque = deque()
+
+    def submit(self, payload: Dict[str, Any]) -> RenderJob:
+        job = RenderJob(payload, asyncio.get_running_loop().create_future())
+        self._jobs[job.job_id] = job
+        self._pending.append(job)
+        self._wake_one()
+        return job
+
+    async def claim(self, worker_id: str, wait: float = 20.0) -> Optional[RenderJob]:
+        """Pobiera następne zadanie (czeka maksymalnie `wait` sekund)"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+
+        while True:
+            self._requeue_expired()
+            while self._pending:
+                job = self._pending.popleft()
+                if job.done or job.job_id not in self._jobs:
+                    continue
+                job.claimed_at = time.time()
+                job.worker_id = worker_id
+                return job
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+
+            # Budzenie przez submit(); co najmniej raz na sekundę sprawdzamy wygasłe lease
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, timeout=min(remaining, 1.0))
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+    async def wait(self, job: RenderJob, timeout: float) -> bool:
+        """Czeka na wynik zadania; False po przekroczeniu timeoutu"""
+        try:
+            await asyncio.wait_for(asyncio.shield(job.future), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def complete(self, job_id: str, artifact: Optional[str] = None, error: Optional[str] = None) -> bool:
+        job = self._jobs.get(job_id)
+        if job is None or job.done:
+            return False
+        job.artifact = artifact
+        job.error = error
+        job.future.set_result(None)
+        return True
+
+    def forget(self, job: RenderJob) -> None:
+        self._jobs.pop(job.job_id, None)
+        if not job.done:
+            job.future.cancel()
+
+    def _wake_one(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    def _requeue_expired(self) -> None:
+        now = time.time()
+        for job in list(self._jobs.values()):
+            if (
+                not job.done
+                and job.claimed_at is not None
+                and now - job.claimed_at > self.lease_seconds
+            ):
+                job.claimed_at = None
+                job.worker_id = None
+                self._pending.append(job)
+
+    def stats(self) -> Dict[str, int]:
+        """Bezpieczne do wywołania z innego wątku (kopie kolekcji)"""
+        jobs = list(self._jobs.values())
+        pending = list(self._pending)
+        in_flight = sum(1 for job in jobs if job.claimed_at is not None and not job.done)
+        return {"queued": sum(1 for job in pending if not job.done), "in_flight": in_flight}
+
+
+# ========== WORKER ==========
+
+def _post_json(url: str, api_key: str, body: Dict[str, Any], timeout: float) -> Tuple[int, Optional[Dict[str, Any]]]:
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(body).encode("utf-8"),
+        headers={"Content-Type": "application/json", "X-API-Key": api_key},
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        raw = response.read()
+        return response.status, (json.loads(raw) if raw else None)
+
+
+def tag_result_zip(zip_bytes: bytes, job_id: str) -> bytes:
+    """
+    Dopisuje job_id w komentarzu ZIP-a z wynikiem. Dzięki temu artefakt wyniku
+    ma skrót unikalny dla zadania i koordynator może go usunąć po pobraniu,
+    nie kasując identycznego wyniku, na który czeka inny request.
+    """
+    buffer = BytesIO(zip_bytes)
+    with zipfile.ZipFile(buffer, "a") as zip_file:
+        zip_file.comment = f"job:{job_id}".encode("ascii")
+    return buffer.getvalue()
+
+
+def fetch_manifest(coordinator_urls: List[str], api_key: str, attempts: int = 12, delay: float = 5.0) -> Dict[str, str]:
+    """
+    Pobiera manifest wszystkich szablonów i produktów (GET /assets/manifest)
+    z pierwszego dostępnego koordynatora. Ponawia próby, bo worker może
+    wystartować przed koordynatorami.
+    """
+    error: Optional[Exception] = None
+    for attempt in range(attempts):
+        for coordinator_url in coordinator_urls:
+            request = urllib.request.Request(
+                f"{coordinator_url.rstrip('/')}/assets/manifest",
+                headers={"X-API-Key": api_key},
+            )
+            try:
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    return json.loads(response.read())["manifest"]
+            except urllib.error.HTTPError:
+                raise
+            except (urllib.error.URLError, OSError) as e:
+                error = e
+        if attempt < attempts - 1:
+            time.sleep(delay)
+    raise RuntimeError(f"No coordinator available: {error}")
+
+
+def run_worker(
+    coordinator_urls: List[str],
+    api_key: str,
+    store: ArtifactStore,
+    cache_root: Path,
+    render_fn: Callable[[Dict[str, Any], Path], bytes],
+    poll_wait: float = 20.0,
+) -> None:
+    """
+    Pętla workera: claim → synchronizacja assetów → render → upload → complete.
+
+    Każdy koordynator ma własną kolejkę w pamięci, więc worker odpytuje
+    wszystkie po kolei (round-robin), a wynik zgłasza temu, który wydał zadanie.
+
+    Args:
+        coordinator_urls: Bazowe URL-e wszystkich koordynatorów (np. ["http://api-1:7077"])
+        api_key: Klucz X-API-Key koordynatorów
+        store: Współdzielony magazyn artefaktów
+        cache_root: Katalog cache workera (templates/ i products/ synchronizowane z magazynu)
+        render_fn: Funkcja renderująca (request, cache_root) → ZIP ze stronami (bytes)
+        poll_wait: Maksymalny czas, po jakim worker wraca do danego koordynatora (s)
+    """
+    base_urls = [url.rstrip("/") for url in coordinator_urls]
+    if not base_urls:
+        raise ValueError("At least one coordinator URL is required")
+
+    # Long-poll dzielony między koordynatory, żeby zadania żadnego z nich nie czekały dłużej niż poll_wait
+    claim_wait = max(poll_wait / len(base_urls), 1.0)
+    cache_root = prepare_worker_cache(cache_root)
+    digests = FileDigestCache()
+    worker_id = f"{os.uname().nodename}-{os.getpid()}"
+    print(f"Render worker {worker_id} polling {', '.join(base_urls)}")
+
+    turn = 0
+    failures = 0
+    while True:
+        base_url = base_urls[turn % len(base_urls)]
+        turn += 1
+
+        try:
+            status, job = _post_json(
+                f"{base_url}/jobs/claim",
+                api_key,
+                {"worker_id": worker_id, "wait": claim_wait},
+                timeout=claim_wait + 10,
+            )
+            failures = 0
+        except (urllib.error.URLError, OSError) as e:
+            print(f"Coordinator {base_url} unavailable ({e})")
+            failures += 1
+            if failures >= len(base_urls):
+                print("No coordinator available, retrying in 5s")
+                time.sleep(5)
+                failures = 0
+            continue
+
+        if status == 204 or not job:
+            continue
+
+        result: Dict[str, Any] = {"worker_id": worker_id}
+        try:
+            sync_assets(store, job["manifest"], cache_root, digests)
+            zip_bytes = tag_result_zip(render_fn(job["request"], cache_root), job["job_id"])
+            result["artifact"] = store.put_bytes(zip_bytes)
+        except Exception as e:
+            result["error"] = str(e)
+
+        try:
+            _post_json(f"{base_url}/jobs/{job['job_id']}/complete", api_key, result, timeout=30)
+        except urllib.error.HTTPError as e:
+            # Koordynator już nie czeka na to zadanie (timeout) - nikt nie pobierze wyniku
+            print(f"Job {job['job_id']} rejected by {base_url} ({e.code}), dropping result")
+            if result.get("artifact"):
+                store.delete(result["artifact"])
+        except (urllib.error.URLError, OSError) as e:
+            # Koordynator odda zadanie innemu workerowi po wygaśnięciu lease
+            print(f"Could not report job {job['job_id']}: {e}")
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Rejestr wersji szablonów i produktów z hot-reloadem.
+
+Watcher (polling) wykrywa zmiany w katalogach TEMPLATES_ROOT/PRODUCTS_ROOT,
+czeka aż pliki przestaną się zmieniać, kopiuje katalog do niezmiennego
+katalogu wersji, waliduje go w tle i dopiero wtedy atomowo podmienia wersję
+w rejestrze. Renderowania w toku trzymają referencję do swojej wersji,
+więc stara wersja jest usuwana dopiero po ich zakończeniu.
+"""
+
+import json
+import shutil
+import hashlib
+import tempfile
+import fnmatch
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Callable, Tuple, Iterator
+from zipfile import ZipFile, BadZipFile
+
+
+class AssetVersion:
+    """Niezmienna, zwalidowana kopia katalogu szablonu lub produktu"""
+
+    def __init__(self, kind: str, name: str, version_id: str, path: Path):
+        self.kind = kind
+        self.name = name
+        self.version_id = version_id
+        self.path = path
+        self.created_at = time.time()
+        self.refcount = 0
+
+    @property
+    def label(self) -> str:
+        return f"{self.name}@{self.version_id}"
+
+
+# Pliki pomijane w katalogach źródłowych: ukryte oraz pliki blokady/tymczasowe Office
+# (Word tworzy ~$<nazwa>.docx na czas edycji i ~WRL*.tmp przy zapisie)
+IGNORED_PATTERNS = (".*", "~$*", "~WRL*.tmp")
+
+
+def is_ignored(name: str) -> bool:
+    return any(fnmatch.fnmatch(name, pattern) for pattern in IGNORED_PATTERNS)
+
+
+def fingerprint_dir(path: Path) -> Tuple:
+    """Szybki odcisk katalogu: (ścieżka, rozmiar, mtime) dla każdego pliku"""
+    entries = []
+    for file_path in sorted(path.rglob("*")):
+        if file_path.is_file() and not is_ignored(file_path.name):
+            stat = file_path.stat()
+            entries.append((file_path.relative_to(path).as_posix(), stat.st_size, stat.st_mtime_ns))
+    return tuple(entries)
+
+
+def validate_files(path: Path) -> None:
+    """Podstawowa walidacja plików wersji: DOCX to poprawny ZIP, JSON się parsuje"""
+    for file_path in sorted(path.rglob("*")):
+        if not file_path.is_file() or is_ignored(file_path.name):
+            continue
+
+        suffix = file_path.suffix.lower()
+        if suffix == ".docx":
+            try:
+                with ZipFile(file_path) as zip_ref:
+                    broken = zip_ref.testzip()
+            except BadZipFile:
+                raise ValueError(f"{file_path.name} is not a valid DOCX (incomplete copy?)")
+            if broken is not None:
+                raise ValueError(f"{file_path.name} is corrupted ({broken})")
+        elif suffix == ".json":
+            try:
+                with open(file_path, "r", encoding="utf-8") as f:
+                    json.load(f)
+            except ValueError as e:
+                raise ValueError(f"{file_path.name} is not valid JSON: {e}")
+
+
+class AssetRegistry:
+    """
+    Rejestr aktualnych wersji katalogów z kilku korzeni, np.
+    {"templates": TEMPLATES_ROOT, "products": PRODUCTS_ROOT}.
+
+    Args:
+        roots: Rodzaj → katalog źródłowy
+        staging_root: Katalog na niezmienne kopie wersji
+        validators: Rodzaj → funkcja(ścieżka_wersji, nazwa) rzucająca wyjątek,
+            jeśli wersja jest niepoprawna (może modyfikować kopię, np. naprawiać tagi)
+        settle_seconds: Jak długo katalog musi być niezmieniony przed publikacją
+    """
+
+    def __init__(
+        self,
+        roots: Dict[str, Path],
+        staging_root: Path,
+        validators: Optional[Dict[str, Callable[[Path, str], None]]] = None,
+        settle_seconds: float = 2.0,
+    ):
+        self.roots = roots
+        self.staging_root = Path(staging_root)
+        self.validators = validators or {}
+        self.settle_seconds = settle_seconds
+
+        self._current: Dict[Tuple[str, str], AssetVersion] = {}
+        self._retired: List[AssetVersion] = []
+        self._seen: Dict[Tuple[str, str], Tuple[Tuple, float]] = {}
+        self._published: Dict[Tuple[str, str], Tuple] = {}
+        self._errors: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+        self.staging_root.mkdir(parents=True, exist_ok=True)
+        self._remove_stale_versions()
+
+    # ---------- odczyt ----------
+
+    def has(self, kind: str, name: str) -> bool:
+        return (kind, name) in self._current
+
+    @contextmanager
+    def use(self, template: str, product_ids: List[str]) -> Iterator[Tuple[AssetVersion, Dict[str, AssetVersion]]]:
+        """
+        Przypina wersje szablonu i produktów na czas renderowania.
+
+        Yields:
+            (wersja szablonu, {product_id: wersja produktu})
+        """
+        with self._lock:
+            current = self._current
+            template_version = current.get(("templates", template))
+            if template_version is None:
+                raise KeyError(f"Template not found in registry: {template}")
+
+            product_versions = {}
+            for product_id in product_ids:
+                product_version = current.get(("products", product_id))
+                if product_version is None:
+                    raise ValueError(f"Product directory not found: {product_id}")
+                product_versions[product_id] = product_version
+
+            pinned = [template_version, *product_versions.values()]
+            for version in pinned:
+                version.refcount += 1
+
+        try:
+            yield template_version, product_versions
+        finally:
+            with self._lock:
+                for version in pinned:
+                    version.refcount -= 1
+                self._collect_retired()
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            status: Dict[str, Any] = {kind: {} for kind in self.roots}
+            for (kind, name), version in sorted(self._current.items()):
+                status[kind][name] = version.version_id
+            status["errors"] = dict(self._errors)
+            return status
+
+    # ---------- publikacja ----------
+
+    def scan(self, initial: bool = False) -> None:
+        """
+        Jedno przejście watchera. Przy initial=True publikuje od razu,
+        bez czekania settle_seconds.
+        """
+        now = time.time()
+        present = set()
+
+        for kind, root in self.roots.items():
+            if not root.exists():
+                continue
+
+            for entry in sorted(root.iterdir()):
+                if not entry.is_dir() or is_ignored(entry.name):
+                    continue
+
+                key = (kind, entry.name)
+                present.add(key)
+                fingerprint = fingerprint_dir(entry)
+
+                if self._published.get(key) == fingerprint:
+                    continue
+
+                seen = self._seen.get(key)
+                if seen is None or seen[0] != fingerprint:
+                    self._seen[key] = (fingerprint, now)
+                    if not initial:
+                        continue
+                elif not initial and now - seen[1] < self.settle_seconds:
+                    continue
+
+                self._publish(kind, entry, fingerprint)
+
+        # Katalogi usunięte ze źródła znikają z rejestru
+        with self._lock:
+            for key in [key for key in self._current if key not in present]:
+                self._retire(self._current[key])
+                self._current = {k: v for k, v in self._current.items() if k != key}
+                self._published.pop(key, None)
+            for error_key in [k for k in self._errors if tuple(k.split("/", 1)) not in present]:
+                self._errors.pop(error_key)
+            self._collect_retired()
+
+    def _publish(self, kind: str, source: Path, fingerprint: Tuple) -> None:
+        key = (kind, source.name)
+        error_key = f"{kind}/{source.name}"
+        staging_tmp = Path(tempfile.mkdtemp(prefix=f".{source.name}.", dir=self.staging_root))
+
+        try:
+            shutil.copytree(source, staging_tmp, dirs_exist_ok=True, ignore=shutil.ignore_patterns(*IGNORED_PATTERNS))
+
+            # Plik zmienił się w trakcie kopiowania - spróbuj w następnym przejściu
+            if fingerprint_dir(source) != fingerprint:
+                shutil.rmtree(staging_tmp, ignore_errors=True)
+                self._seen.pop(key, None)
+                return
+
+            version_id = self._content_hash(staging_tmp)
+            current = self._current.get(key)
+            if current is not None and current.version_id == version_id:
+                shutil.rmtree(staging_tmp, ignore_errors=True)
+                # Przywrócono treść aktualnej wersji - poprzednie odrzucenie jest nieaktualne
+                with self._lock:
+                    self._published[key] = fingerprint
+                    self._errors.pop(error_key, None)
+                return
+
+            validate_files(staging_tmp)
+            validator = self.validators.get(kind)
+            if validator is not None:
+                validator(staging_tmp, source.name)
+
+            # Unikalna nazwa katalogu: ta sama treść może wrócić, gdy stara kopia jest jeszcze w użyciu
+            version_dir = self.staging_root / kind / source.name / f"{version_id}.{uuid.uuid4().hex[:8]}"
+            version_dir.parent.mkdir(parents=True, exist_ok=True)
+            staging_tmp.rename(version_dir)
+        except Exception as e:
+            shutil.rmtree(staging_tmp, ignore_errors=True)
+            # Zostaje poprzednia wersja; ponowna próba dopiero po kolejnej zmianie pliku
+            self._published[key] = fingerprint
+            self._errors[error_key] = str(e)
+            print(f"Rejected new version of {error_key}: {e}")
+            return
+
+        version = AssetVersion(kind, source.name, version_id, version_dir)
+        with self._lock:
+            previous = self._current.get(key)
+            # Atomowa podmiana: nowy słownik zamiast modyfikacji w miejscu
+            self._current = {**self._current, key: version}
+            if previous is not None:
+                self._retire(previous)
+            self._published[key] = fingerprint
+            self._errors.pop(error_key, None)
+            self._collect_retired()
+
+        print(f"Published {kind}/{version.label}")
+
+    def _remove_stale_versions(self) -> None:
+        """Usuwa wersje i kopie robocze pozostawione w staging_root przez poprzedni proces"""
+        for entry in self.staging_root.iterdir():
+            if entry.is_dir() and (entry.name in self.roots or entry.name.startswith(".")):
+                shutil.rmtree(entry, ignore_errors=True)
+
+    @staticmethod
+    def _content_hash(path: Path) -> str:
+        digest = hashlib.sha256()
+        for file_path in sorted(path.rglob("*")):
+            if file_path.is_file():
+                digest.update(file_path.relative_to(path).as_posix().encode("utf-8"))
+                digest.update(hashlib.sha256(file_path.read_bytes()).digest())
+        return digest.hexdigest()[:12]
+
+    def _retire(self, version: AssetVersion) -> None:
+        self._retired.append(version)
+
+    def _collect_retired(self) -> None:
+        """Usuwa katalogi starych wersji, których nie używa już żadne renderowanie"""
+        still_used = []
+        for version in self._retired:
+            if version.refcount > 0:
+                still_used.append(version)
+            else:
+                shutil.rmtree(version.path, ignore_errors=True)
+        self._retired = still_used
+
+    # ---------- watcher ----------
+
+    def watch(self, interval: float = 2.0) -> None:
+        """Pętla watchera (uruchamiana w osobnym wątku)"""
+        while not self._stop.wait(interval):
+            try:
+                self.scan()
+            except Exception as e:
+                print(f"Template watcher error: {e}")
+
+    def start_watcher(self, interval: float = 2.0) -> threading.Thread:
+        thread = threading.Thread(target=self.watch, args=(interval,), name="template-watcher", daemon=True)
+        thread.start()
+        self._watcher = thread
+        return thread
+
+    def stop(self, remove_staging: bool = False) -> None:
+        """
+        Zatrzymuje watcher. remove_staging=True usuwa też katalog wersji
+        (np. tymczasowy katalog utworzony tylko dla tego procesu).
+        """
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=30)
+        if remove_staging:
+            shutil.rmtree(self.staging_root, ignore_errors=True)
@@ -0,0 +1,79 @@
+"""
+Testy szacowania liczby stron DOCX w konwerterze zastępczym (fake_converter.py).
+"""
+
+import sys
+import zipfile
+from pathlib import Path
+from typing import Optional
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fake_converter import count_docx_pages  # noqa: E402
+
+
+def paragraph(text: str = "Oferta") -> str:
+    return f"<w:p><w:r><w:t>{text}</w:t></w:r></w:p>"
+
+
+PAGE_BREAK = '<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+LINE_BREAK = "<w:p><w:r><w:br/></w:r></w:p>"
+BODY_SECTION = '<w:sectPr><w:pgSz w:w="11906" w:h="16838"/></w:sectPr>'
+
+
+def section_break(kind: Optional[str] = None) -> str:
+    """Akapit kończący sekcję; typ (w:type) opisuje początek następnej sekcji"""
+    section_type = f'<w:type w:val="{kind}"/>' if kind else ""
+    return f'<w:p><w:pPr><w:sectPr>{section_type}<w:pgSz w:w="11906" w:h="16838"/></w:sectPr></w:pPr></w:p>'
+
+
+def body_section(kind: str) -> str:
+    return f'<w:sectPr><w:type w:val="{kind}"/><w:pgSz w:w="11906" w:h="16838"/></w:sectPr>'
+
+
+def make_docx(path: Path, body: str, app_pages: Optional[int] = None) -> Path:
+    document = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f"<w:body>{body}</w:body></w:document>"
+    )
+    with zipfile.ZipFile(path, "w") as zip_file:
+        zip_file.writestr("word/document.xml", document)
+        if app_pages is not None:
+            zip_file.writestr("docProps/app.xml", f"<Properties><Pages>{app_pages}</Pages></Properties>")
+    return path
+
+
+@pytest.mark.parametrize("body, expected", [
+    # Jawne podziały strony; zwykły <w:br/> to nowa linia
+    (paragraph() + PAGE_BREAK + paragraph() + PAGE_BREAK + paragraph() + BODY_SECTION, 3),
+    (paragraph() + LINE_BREAK + paragraph() + BODY_SECTION, 1),
+    # pageBreakBefore (z w:val="0" / "false" wyłączony)
+    (paragraph() + '<w:p><w:pPr><w:pageBreakBefore/></w:pPr></w:p>' + BODY_SECTION, 2),
+    (paragraph() + '<w:p><w:pPr><w:pageBreakBefore w:val="0"/></w:pPr></w:p>' + BODY_SECTION, 1),
+    (paragraph() + '<w:p><w:pPr><w:pageBreakBefore w:val="false"/></w:pPr></w:p>' + BODY_SECTION, 1),
+    # Podziały sekcji: nextPage (domyślny) dzieli stronę, continuous nie
+    (paragraph() + section_break() + paragraph() + BODY_SECTION, 2),
+    (paragraph() + section_break() + paragraph() + body_section("continuous"), 1),
+    (paragraph() + section_break() + paragraph() + body_section("nextPage"), 2),
+    (paragraph() + section_break("continuous") + paragraph() + section_break() + paragraph() + BODY_SECTION, 3),
+])
+def test_counts_page_and_section_breaks(tmp_path, body, expected):
+    assert count_docx_pages(make_docx(tmp_path / "offer.docx", body)) == expected
+
+
+def test_break_count_wins_over_stale_app_pages(tmp_path):
+    body = paragraph() + PAGE_BREAK + paragraph() + PAGE_BREAK + paragraph() + BODY_SECTION
+
+    assert count_docx_pages(make_docx(tmp_path / "offer.docx", body, app_pages=1)) == 3
+    assert count_docx_pages(make_docx(tmp_path / "offer.docx", body, app_pages=9)) == 3
+
+
+def test_app_pages_fallback_without_breaks(tmp_path):
+    body = paragraph() * 50 + BODY_SECTION
+
+    assert count_docx_pages(make_docx(tmp_path / "flowing.docx", body, app_pages=5)) == 5
+    assert count_docx_pages(make_docx(tmp_path / "no_app.docx", body)) == 1
+    assert count_docx_pages(make_docx(tmp_path / "zero.docx", body, app_pages=0)) == 1
@@ -0,0 +1,120 @@
+"""
+Testy post-processingu podglądów (preview_images.py) i reguły pomijania
+pustych stron w convert_pdf_to_images (offer_api.py).
+"""
+
+import sys
+from pathlib import Path
+
+import fitz  # PyMuPDF
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import preview_images  # noqa: E402
+from preview_images import analyze_page, choose_codec, trim_margins, use_palette  # noqa: E402
+from offer_api import convert_pdf_to_images  # noqa: E402
+
+
+def blank_page() -> np.ndarray:
+    return np.full((400, 300, 3), 255, dtype=np.uint8)
+
+
+def text_page() -> np.ndarray:
+    arr = blank_page()
+    # Czarne "linijki tekstu" w środku strony
+    for top in range(100, 200, 20):
+        arr[top:top + 6, 50:250] = 0
+    return arr
+
+
+def photo_page() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    arr = blank_page()
+    arr[50:350, 30:270] = rng.integers(0, 256, size=(300, 240, 3), dtype=np.uint8)
+    return arr
+
+
+# ---------- klasyfikacja stron ----------
+
+def test_analyze_blank_page():
+    stats = analyze_page(blank_page())
+
+    assert stats["blank"]
+    assert not stats["photo"]
+    assert stats["bbox"] is None
+
+
+def test_analyze_text_page():
+    stats = analyze_page(text_page())
+
+    assert not stats["blank"]
+    assert not stats["photo"]
+    assert stats["bbox"] == (100, 186, 50, 250)
+
+
+def test_analyze_photo_page():
+    stats = analyze_page(photo_page())
+
+    assert not stats["blank"]
+    assert stats["photo"]
+
+
+def test_trim_margins_keeps_padding():
+    arr = text_page()
+    trimmed = trim_margins(arr, analyze_page(arr)["bbox"], padding=10)
+
+    assert trimmed.shape == (106, 220, 3)
+
+
+# ---------- wybór kodeka ----------
+
+def test_auto_uses_palette_png_for_text_and_webp_for_photos():
+    text_stats, photo_stats = analyze_page(text_page()), analyze_page(photo_page())
+
+    assert choose_codec("auto", text_stats) == "png"
+    assert use_palette("auto", text_stats)
+    assert choose_codec("auto", photo_stats) == "webp"
+    assert not use_palette("auto", photo_stats)
+
+
+def test_explicit_png_is_lossless():
+    for stats in (analyze_page(text_page()), analyze_page(photo_page())):
+        assert choose_codec("png", stats) == "png"
+        assert not use_palette("png", stats)
+
+
+@pytest.mark.parametrize("supported, expected", [(True, "avif"), (False, "webp")])
+def test_avif_falls_back_to_webp(monkeypatch, supported, expected):
+    monkeypatch.setattr(preview_images, "avif_supported", lambda: supported)
+
+    assert choose_codec("avif", analyze_page(photo_page())) == expected
+
+
+# ---------- pomijanie pustych stron ----------
+
+def make_pdf(path: Path, pages: list) -> Path:
+    """pages: lista True (strona z tekstem) / False (pusta strona)"""
+    doc = fitz.open()
+    for has_text in pages:
+        page = doc.new_page(width=200, height=200)
+        if has_text:
+            page.insert_text((20, 50), "Oferta", fontsize=24)
+    doc.save(path)
+    doc.close()
+    return path
+
+
+@pytest.mark.parametrize("pages, expected", [
+    ([True, False, True], ["page_001.jpg", "page_003.jpg"]),
+    ([False, True], ["page_002.jpg"]),
+    ([False, False], ["page_002.jpg"]),
+    ([False], ["page_001.jpg"]),
+])
+def test_skip_blank_keeps_at_least_one_page(tmp_path, pages, expected):
+    pdf_path = make_pdf(tmp_path / "offer.pdf", pages)
+
+    page_paths = convert_pdf_to_images(pdf_path, tmp_path, dpi=36, skip_blank=True)
+
+    assert [path.name for path in page_paths] == expected
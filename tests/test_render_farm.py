@@ -0,0 +1,220 @@
+"""
+Testy trybu rozproszonego (render_farm.py): magazyn artefaktów, kolejka zadań,
+synchronizacja assetów. Test S3 uruchamia się tylko z lokalnym MinIO:
+
+    MINIO_ENDPOINT=http://localhost:9000 AWS_ACCESS_KEY_ID=minioadmin \\
+        AWS_SECRET_ACCESS_KEY=minioadmin python -m pytest tests/test_render_farm.py
+"""
+
+import os
+import sys
+import time
+import uuid
+import asyncio
+import shutil
+import zipfile
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from render_farm import (  # noqa: E402
+    ArtifactStore,
+    AssetPublisher,
+    FilesystemArtifactStore,
+    JobQueue,
+    S3ArtifactStore,
+    prepare_worker_cache,
+    sha256_bytes,
+    sync_assets,
+    tag_result_zip,
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return FilesystemArtifactStore(tmp_path / "store")
+
+
+@pytest.fixture
+def source(tmp_path):
+    root = tmp_path / "source"
+    (root / "templates" / "offer").mkdir(parents=True)
+    (root / "templates" / "offer" / "main.docx").write_bytes(b"docx-v1")
+    (root / "templates" / "offer" / "offer.json").write_bytes(b"{}")
+    (root / "products" / "1").mkdir(parents=True)
+    (root / "products" / "1" / "1.docx").write_bytes(b"product-1")
+    return root
+
+
+def publish(publisher, source):
+    manifest = publisher.publish_dir(source / "templates", "offer", "templates")
+    manifest.update(publisher.publish_dir(source / "products", "1", "products"))
+    return manifest
+
+
+# ---------- magazyn ----------
+
+def test_artifact_store_is_abstract():
+    with pytest.raises(TypeError):
+        ArtifactStore()
+
+
+def test_filesystem_store_roundtrip(store, tmp_path):
+    digest = store.put_bytes(b"pages")
+
+    assert digest == sha256_bytes(b"pages")
+    assert store.exists(digest)
+    assert store.get_bytes(digest) == b"pages"
+    assert store.put_bytes(b"pages") == digest
+
+    dest = store.fetch_to(digest, tmp_path / "out" / "pages.zip")
+    assert dest.read_bytes() == b"pages"
+
+    with pytest.raises(KeyError):
+        store.get_bytes(sha256_bytes(b"missing"))
+
+    store.delete(digest)
+    assert not store.exists(digest)
+    store.delete(digest)
+
+
+def test_filesystem_store_detects_corruption(store, tmp_path):
+    digest = store.put_bytes(b"pages")
+    store._path(digest).write_bytes(b"tampered")
+
+    with pytest.raises(RuntimeError):
+        store.fetch_to(digest, tmp_path / "pages.zip")
+
+
+def test_publisher_reuploads_after_store_wipe(store, source):
+    publisher = AssetPublisher(store, verify_seconds=0)
+    manifest = publish(publisher, source)
+    assert all(store.exists(digest) for digest in manifest.values())
+
+    shutil.rmtree(store.root)
+    publish(publisher, source)
+    assert all(store.exists(digest) for digest in manifest.values())
+
+
+def test_result_zip_is_unique_per_job():
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_file:
+        zip_file.writestr("page_001.jpg", b"jpeg")
+    zip_bytes = buffer.getvalue()
+
+    first, second = tag_result_zip(zip_bytes, "job-1"), tag_result_zip(zip_bytes, "job-2")
+
+    assert sha256_bytes(first) != sha256_bytes(second)
+    with zipfile.ZipFile(BytesIO(first)) as zip_file:
+        assert zip_file.read("page_001.jpg") == b"jpeg"
+        assert zip_file.comment == b"job:job-1"
+
+
+# ---------- synchronizacja ----------
+
+def test_sync_assets_into_worker_cache(store, source, tmp_path):
+    manifest = publish(AssetPublisher(store), source)
+    cache = prepare_worker_cache(tmp_path / "cache")
+
+    assert sync_assets(store, manifest, cache) == 3
+    assert (cache / "templates" / "offer" / "main.docx").read_bytes() == b"docx-v1"
+    assert (cache / "products" / "1" / "1.docx").read_bytes() == b"product-1"
+
+    # Niezmienione pliki nie są pobierane ponownie, a pliki spoza manifestu znikają
+    stale = cache / "templates" / "offer" / "old.docx"
+    stale.write_bytes(b"stale")
+    assert sync_assets(store, manifest, cache) == 0
+    assert not stale.exists()
+
+    # Nowa wersja pliku jest pobierana
+    (source / "templates" / "offer" / "main.docx").write_bytes(b"docx-v2")
+    manifest = publish(AssetPublisher(store), source)
+    assert sync_assets(store, manifest, cache) == 1
+    assert (cache / "templates" / "offer" / "main.docx").read_bytes() == b"docx-v2"
+
+
+def test_worker_cache_refuses_real_checkout(store, source):
+    with pytest.raises(RuntimeError):
+        prepare_worker_cache(source)
+
+    manifest = publish(AssetPublisher(store), source)
+    with pytest.raises(RuntimeError):
+        sync_assets(store, manifest, source)
+    assert (source / "templates" / "offer" / "offer.json").exists()
+
+
+def test_sync_assets_rejects_path_traversal(store, tmp_path):
+    cache = prepare_worker_cache(tmp_path / "cache")
+    with pytest.raises(ValueError):
+        sync_assets(store, {"templates/../../etc/passwd": "0" * 64}, cache)
+
+
+# ---------- kolejka ----------
+
+def test_job_queue_claim_and_complete():
+    async def scenario():
+        queue = JobQueue(lease_seconds=60)
+        assert await queue.claim("w1", wait=0.05) is None
+
+        claim = asyncio.ensure_future(queue.claim("w1", wait=5))
+        await asyncio.sleep(0.01)
+        job = queue.submit({"request": {}})
+        assert await claim is job
+        assert queue.stats() == {"queued": 0, "in_flight": 1}
+
+        assert queue.complete(job.job_id, artifact="abc")
+        assert await queue.wait(job, timeout=1)
+        assert job.artifact == "abc"
+        assert not queue.complete(job.job_id, artifact="again")
+
+    asyncio.run(scenario())
+
+
+def test_job_queue_requeues_expired_lease():
+    async def scenario():
+        queue = JobQueue(lease_seconds=0.05)
+        job = queue.submit({"request": {}})
+        assert await queue.claim("w1", wait=0.1) is job
+
+        await asyncio.sleep(0.1)
+        assert await queue.claim("w2", wait=0.1) is job
+        assert job.worker_id == "w2"
+
+    asyncio.run(scenario())
+
+
+def test_job_queue_wait_times_out():
+    async def scenario():
+        queue = JobQueue()
+        job = queue.submit({"request": {}})
+        assert not await queue.wait(job, timeout=0.05)
+        queue.forget(job)
+        assert await queue.claim("w1", wait=0.05) is None
+
+    asyncio.run(scenario())
+
+
+# ---------- S3 / MinIO (opcjonalnie) ----------
+
+@pytest.mark.skipif(not os.getenv("MINIO_ENDPOINT"), reason="set MINIO_ENDPOINT to run against a local MinIO")
+def test_s3_store_roundtrip_minio(tmp_path):
+    boto3 = pytest.importorskip("boto3")
+
+    bucket = f"offer-test-{uuid.uuid4().hex[:8]}"
+    boto3.client("s3", endpoint_url=os.environ["MINIO_ENDPOINT"]).create_bucket(Bucket=bucket)
+    s3_store = S3ArtifactStore(bucket=bucket, prefix="test", endpoint_url=os.environ["MINIO_ENDPOINT"])
+
+    missing = sha256_bytes(str(time.time()).encode())
+    assert not s3_store.exists(missing)
+    with pytest.raises(KeyError):
+        s3_store.get_bytes(missing)
+
+    digest = s3_store.put_bytes(b"pages")
+    assert s3_store.exists(digest)
+    assert s3_store.fetch_to(digest, tmp_path / "pages.zip").read_bytes() == b"pages"
+
+    s3_store.delete(digest)
+    assert not s3_store.exists(digest)
@@ -0,0 +1,120 @@
+"""
+Testy rejestru wersji szablonów z hot-reloadem (template_registry.py).
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from template_registry import AssetRegistry, fingerprint_dir  # noqa: E402
+
+
+def reject_broken(path: Path, name: str) -> None:
+    if (path / "main.txt").read_text() == "broken":
+        raise ValueError("broken template")
+
+
+@pytest.fixture
+def source(tmp_path):
+    root = tmp_path / "templates"
+    (root / "offer").mkdir(parents=True)
+    (root / "offer" / "main.txt").write_text("v1")
+    return root
+
+
+@pytest.fixture
+def registry(source, tmp_path):
+    registry = AssetRegistry(
+        roots={"templates": source},
+        staging_root=tmp_path / "versions",
+        validators={"templates": reject_broken},
+        settle_seconds=0.2,
+    )
+    registry.scan(initial=True)
+    return registry
+
+
+def write(path: Path, content: str) -> None:
+    path.write_text(content)
+    # Zmiana mtime także przy zapisie w tym samym takcie zegara systemu plików
+    stamp = time.time() + 10
+    os.utime(path, (stamp, stamp))
+
+
+def settle(registry: AssetRegistry) -> None:
+    """Dwa przejścia watchera: wykrycie zmiany, publikacja po settle_seconds"""
+    registry.scan()
+    time.sleep(registry.settle_seconds + 0.05)
+    registry.scan()
+
+
+def current_version(registry: AssetRegistry) -> str:
+    return registry.status()["templates"]["offer"]
+
+
+def test_swap_after_settle_time(registry, source):
+    v1 = current_version(registry)
+    write(source / "offer" / "main.txt", "v2")
+
+    registry.scan()
+    assert current_version(registry) == v1
+
+    time.sleep(registry.settle_seconds + 0.05)
+    registry.scan()
+    assert current_version(registry) != v1
+
+    with registry.use("offer", []) as (template, _):
+        assert (template.path / "main.txt").read_text() == "v2"
+
+
+def test_pinned_version_survives_swap_and_is_collected(registry, source):
+    with registry.use("offer", []) as (pinned, _):
+        write(source / "offer" / "main.txt", "v2")
+        settle(registry)
+
+        assert current_version(registry) != pinned.version_id
+        assert (pinned.path / "main.txt").read_text() == "v1"
+
+    assert not pinned.path.exists()
+
+
+def test_rejected_version_keeps_previous(registry, source):
+    v1 = current_version(registry)
+    write(source / "offer" / "main.txt", "broken")
+    settle(registry)
+
+    status = registry.status()
+    assert status["templates"]["offer"] == v1
+    assert "broken template" in status["errors"]["templates/offer"]
+
+
+def test_restoring_content_clears_error(registry, source):
+    write(source / "offer" / "main.txt", "broken")
+    settle(registry)
+    assert "templates/offer" in registry.status()["errors"]
+
+    write(source / "offer" / "main.txt", "v1")
+    settle(registry)
+    assert registry.status()["errors"] == {}
+
+
+def test_office_lock_files_are_ignored(registry, source):
+    v1 = current_version(registry)
+    (source / "offer" / "~$main.docx").write_bytes(b"owner file, not a zip")
+    (source / "offer" / "~WRL0001.tmp").write_bytes(b"temp")
+
+    settle(registry)
+    assert current_version(registry) == v1
+    assert registry.status()["errors"] == {}
+    assert [entry[0] for entry in fingerprint_dir(source / "offer")] == ["main.txt"]
+
+
+def test_stop_removes_staging_root(registry, tmp_path):
+    registry.stop(remove_staging=True)
+
+    assert not (tmp_path / "versions").exists()